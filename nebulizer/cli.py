@@ -6,7 +6,6 @@ import getpass
 import logging
 import click
 import time
-import fnmatch
 from nebulizer import get_version
 from .core import get_galaxy_instance
 from .core import get_current_user
@@ -14,7 +13,9 @@ from .core import get_galaxy_config
 from .core import ping_galaxy_instance
 from .core import prompt_for_confirmation
 from .core import turn_off_urllib3_warnings
-from .core import Credentials
+from .core import use_shared_http_session
+from .core import compile_glob
+from .core import get_credentials
 from .core import Reporter
 from . import options
 from . import users
@@ -50,15 +51,21 @@ def handle_debug(debug=True):
     """
     Turn on debugging output from logging
 
+    Unless debugging output is turned on, the connection
+    and retry warnings from urllib3 are also suppressed.
+
     Arguments:
       debug (bool): if True then turn on debugging output
 
     """
     if debug:
         level = logging.DEBUG
+        urllib3_level = logging.NOTSET
     else:
         level = logging.WARNING
+        urllib3_level = logging.CRITICAL
     logging.getLogger("nebulizer").setLevel(level)
+    logging.getLogger("urllib3").setLevel(urllib3_level)
 
 def handle_suppress_warnings(suppress_warnings=True):
     """
@@ -129,12 +136,16 @@ class Context:
         self.no_verify = False
         self.debug = False
 
-    def galaxy_instance(self,alias,validate_key=True):
+    def galaxy_instance(self,alias,validate_key=True,
+                        check_connection=True):
         """
         Return Galaxy instance based on context
 
         Attempts to create a Bioblend based on the supplied
         arguments to the nebulizer command.
+
+        If 'check_connection' is False then the connection
+        isn't verified before the instance is returned.
         """
         email,password = handle_credentials(
             self.username,
@@ -143,9 +154,26 @@ class Context:
         gi = get_galaxy_instance(alias,api_key=self.api_key,
                                  email=email,password=password,
                                  validate_key=validate_key,
+                                 check_connection=check_connection,
                                  verify_ssl=(not self.no_verify))
         return gi
 
+    def connect(self,alias,validate_key=True,check_connection=True):
+        """
+        Return Galaxy instance based on context, or exit
+
+        Wraps the 'galaxy_instance' method: if the Galaxy
+        instance can't be obtained then reports an error and
+        exits with status 1.
+        """
+        gi = self.galaxy_instance(alias,
+                                  validate_key=validate_key,
+                                  check_connection=check_connection)
+        if gi is None:
+            logger.critical("Failed to connect to Galaxy instance")
+            sys.exit(1)
+        return gi
+
 pass_context = click.make_pass_decorator(Context,ensure=True)
 
 @click.group()
@@ -189,6 +217,7 @@ def nebulizer(context,api_key,username,galaxy_password,
     handle_debug(debug=context.debug)
     handle_suppress_warnings(suppress_warnings=context.suppress_warnings)
     handle_ssl_warnings(verify=(not context.no_verify))
+    use_shared_http_session()
 
 @nebulizer.command(name="list_keys")
 @click.option("--name",
@@ -205,12 +234,12 @@ def list_keys(context,name,show_api_keys=False):
     Prints a list of stored aliases with the associated
     Galaxy URLs; optionally also show the API key string.
     """
-    instances = Credentials()
+    instances = get_credentials()
     aliases = instances.list_keys()
     if name:
-        name = name.lower()
+        name_match = compile_glob(name.lower())
         aliases = [alias for alias in aliases
-                   if fnmatch.fnmatch(alias.lower(),name)]
+                   if name_match(alias.lower())]
     output = Reporter()
     for alias in aliases:
         galaxy_url,api_key = instances.fetch_key(alias)
@@ -236,16 +265,16 @@ def add_key(context,alias,galaxy_url,api_key=None):
     If API_KEY is not supplied then nebulizer will
     attempt to fetch one automatically.
     """
-    instances = Credentials()
+    instances = get_credentials()
     if alias in instances.list_keys():
-        logger.error("'%s' already exists" % alias)
+        logger.error("'%s' already exists",alias)
         sys.exit(1)
     if api_key is None:
         # No API key supplied as argument, try to connect
         # to Galaxy and fetch directly
         gi = context.galaxy_instance(galaxy_url)
         if gi is None:
-            logger.fatal("%s: failed to connect" % galaxy_url)
+            logger.fatal("%s: failed to connect",galaxy_url)
             sys.exit(1)
         api_key = gi.key
     # Store the entry
@@ -268,9 +297,9 @@ def update_key(context,alias,new_url,new_api_key,fetch_api_key):
     Update the Galaxy URL and/or API key stored
     against ALIAS.
     """
-    instances = Credentials()
+    instances = get_credentials()
     if alias not in instances.list_keys():
-        logger.error("'%s': not found" % alias)
+        logger.error("'%s': not found",alias)
         sys.exit(1)
     if new_url:
         galaxy_url = new_url
@@ -282,7 +311,7 @@ def update_key(context,alias,new_url,new_api_key,fetch_api_key):
         # Attempt to connect to Galaxy and fetch API key
         gi = context.galaxy_instance(alias)
         if gi is None:
-            logger.critical("%s: failed to connect" % alias)
+            logger.critical("%s: failed to connect",alias)
             sys.exit(1)
         new_api_key = gi.key
     if not instances.update_key(alias,
@@ -300,9 +329,9 @@ def remove_key(context,alias):
     Removes the Galaxy URL/API key pair associated with
     ALIAS from the list of stored keys.
     """
-    instances = Credentials()
+    instances = get_credentials()
     if not instances.has_key(alias):
-        logger.fatal("No alias '%s' to remove" % alias)
+        logger.fatal("No alias '%s' to remove",alias)
         sys.exit(1)
     print("Removing key for alias '%s'" % alias)
     if prompt_for_confirmation("Proceed?"):
@@ -338,15 +367,12 @@ def list_users(context,galaxy,name,status,long_listing,sort,show_id):
     Prints details of user accounts in GALAXY instance.
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # Turn sort keys into a list
     sort_keys = sort.split(',')
     for key in sort_keys:
         if key not in ('email','disk_usage','quota','quota_usage'):
-            logger.fatal("'%s': invalid sort key" % key)
+            logger.fatal("'%s': invalid sort key",key)
             sys.exit(1)
     # List users
     sys.exit(users.list_users(gi,name=name,
@@ -359,12 +385,8 @@ def list_users(context,galaxy,name,status,long_listing,sort,show_id):
 @click.option('--password','-p',
               help="specify password for new user account "
               "(otherwise program will prompt for password)")
-@click.option('--check','-c','only_check',is_flag=True,
-              help="check user details but don't try to create the "
-              "new account")
-@click.option('--message','-m','message_template',
-              type=click.Path(exists=True),
-              help="Mako template to populate and output")
+@options.only_check_option()
+@options.message_template_option()
 @click.argument("galaxy")
 @click.argument("email")
 @click.argument("public_name",required=False)
@@ -384,14 +406,12 @@ def create_user(context,galaxy,email,public_name,password,only_check,
     # Check message template is a .mako file
     if message_template:
         if not message_template.endswith(".mako"):
-            logger.critical("Message template '%s' is not a .mako file"
-                            % message_template)
+            logger.critical("Message template '%s' is not a .mako file",
+                            message_template)
             sys.exit(1)
+        message_template = users.load_mako_template(message_template)
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # Sort out email and public name
     if public_name:
         if not users.check_username_format(public_name):
@@ -414,16 +434,15 @@ def create_user(context,galaxy,email,public_name,password,only_check,
               "(otherwise program will prompt for password). "
               "All accounts will be created with the same "
               "password.")
-@click.option('--check','-c','only_check',is_flag=True,
-              help="check user details but don't try to create "
-              "the new account.")
+@options.only_check_option(account='new accounts')
+@options.jobs_option('accounts')
 @click.argument("galaxy")
 @click.argument("template")
 @click.argument("start",type=int)
 @click.argument("end",type=int,required=False)
 @pass_context
 def create_batch_users(context,galaxy,template,start,end,
-                       password,only_check):
+                       password,only_check,jobs):
     """
     Create multiple Galaxy users from a template.
 
@@ -443,10 +462,7 @@ def create_batch_users(context,galaxy,template,start,end,
     user5@galaxy.org
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # Sort out start and end indices
     if end is None:
         end = start
@@ -454,20 +470,18 @@ def create_batch_users(context,galaxy,template,start,end,
     # Create users
     sys.exit(users.create_users_from_template(gi,template,
                                               start,end,password,
-                                              only_check=only_check))
+                                              only_check=only_check,
+                                              max_workers=jobs))
 
 @nebulizer.command(name="create_users_from_file")
-@click.option('--check','-c','only_check',is_flag=True,
-              help="check user details but don't try to create the "
-              "new account.")
-@click.option('--message','-m','message_template',
-              type=click.Path(exists=True),
-              help="Mako template to populate and output.")
+@options.only_check_option(account='new accounts')
+@options.message_template_option()
+@options.jobs_option('accounts')
 @click.argument("galaxy")
 @click.argument("file",type=click.Path(exists=True))
 @pass_context
 def create_users_from_file(context,galaxy,file,message_template,
-                           only_check):
+                           only_check,jobs):
     """
     Create multiple Galaxy users from a file.
 
@@ -482,26 +496,24 @@ def create_users_from_file(context,galaxy,file,message_template,
     # Check message template is a .mako file
     if message_template:
         if not message_template.endswith(".mako"):
-            logger.critical("Message template '%s' is not a .mako file"
-                            % message_template)
+            logger.critical("Message template '%s' is not a .mako file",
+                            message_template)
             sys.exit(1)
+        message_template = users.load_mako_template(message_template)
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # Create users
     sys.exit(users.create_batch_of_users(gi,file,
                                          only_check=only_check,
-                                         mako_template=message_template))
+                                         mako_template=message_template,
+                                         max_workers=jobs))
 
 @nebulizer.command(name="delete_user")
 @click.argument("galaxy")
 @click.argument("email")
 @click.option('-p','--purge',is_flag=True,
               help="also purge (permanently delete) the user.")
-@click.option('-y','--yes',is_flag=True,
-              help="don't ask for confirmation of deletions.")
+@options.no_confirm_option('deletions')
 @pass_context
 def delete_user(context,galaxy,email,purge,yes):
     """
@@ -510,10 +522,7 @@ def delete_user(context,galaxy,email,purge,yes):
     Removes user account with username EMAIL from GALAXY.
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     sys.exit(users.delete_user(gi,email,purge=purge,no_confirm=yes))
 
 @nebulizer.command(name="list_tools")
@@ -588,10 +597,7 @@ def list_tools(context,galaxy,name,toolshed,owner,updateable,built_in,
     included. (NB this option is ignored in 'export' mode.)
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # List repositories
     sys.exit(tools.list_tools(
         gi,name=name,
@@ -620,10 +626,7 @@ def list_tool_panel(context,galaxy,name,list_tools):
     tools available outside of any section.
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # List tool panel contents
     sys.exit(tools.list_tool_panel(gi,name=name,
                                    list_tools=list_tools))
@@ -641,14 +644,9 @@ def list_tool_panel(context,galaxy,name,list_tools):
 @click.option('--file',metavar='TSV_FILE',
               type=click.File('rt'),
               help="install tools specified in TSV_FILE.")
-@click.option('--timeout',metavar='TIMEOUT',default=600,
-              help="wait up to TIMEOUT seconds for tool installations"
-              "to complete (default is 600).")
-@click.option('--no-wait',is_flag=True,
-              help="don't wait for lengthy tool installations to "
-              "complete.")
-@click.option('-y','--yes',is_flag=True,
-              help="don't ask for confirmation of installation.")
+@options.timeout_option(default=600)
+@options.no_wait_option()
+@options.no_confirm_option('installation')
 @click.argument("galaxy")
 @click.argument("repository",nargs=-1)
 @pass_context
@@ -713,10 +711,7 @@ def install_tool(context,galaxy,repository,tool_panel_section,
                          "spec or a file (via --file)")
             sys.exit(1)
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # Install tool(s)
     if repository:
         # Single repository
@@ -784,17 +779,12 @@ def install_tool(context,galaxy,repository,tool_panel_section,
 @options.install_tool_dependencies_option(default='yes')
 @options.install_repository_dependencies_option(default='yes')
 @options.install_resolver_dependencies_option(default='yes')
-@click.option('--timeout',metavar='TIMEOUT',default=600,
-              help="wait up to TIMEOUT seconds for tool installations"
-              "to complete (default is 600).")
-@click.option('--no-wait',is_flag=True,
-              help="don't wait for lengthy tool installations to "
-              "complete.")
+@options.timeout_option(default=600)
+@options.no_wait_option()
 @click.option('--check-toolshed',is_flag=True,
               help="check installed revisions directly against those "
               "available in the toolshed.")
-@click.option('-y','--yes',is_flag=True,
-              help="don't ask for confirmation of updates.")
+@options.no_confirm_option('updates')
 @click.argument("galaxy")
 @click.argument("repository",nargs=-1)
 @pass_context
@@ -837,14 +827,11 @@ def update_tool(context,galaxy,repository,
     print(f"Updating {owner}/{repository} from {toolshed}")
     if revision is not None:
         logger.fatal("A revision ('%s') was also supplied "
-                     "but this is not valid for tool update "
-                     % revision)
+                     "but this is not valid for tool update ",
+                     revision)
         sys.exit(1)
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # Install tool
     sys.exit(tools.update_tool(gi,toolshed,repository,owner,
                                timeout=timeout,no_wait=no_wait,
@@ -861,8 +848,7 @@ def update_tool(context,galaxy,repository,
 @click.option('--remove_from_disk',is_flag=True,
               help="remove the uninstalled tool from disk (otherwise "
               "tool is just deactivated).")
-@click.option('-y','--yes',is_flag=True,
-              help="don't ask for confirmation of uninstallation.")
+@options.no_confirm_option('uninstallation')
 @click.argument("galaxy")
 @click.argument("repository",nargs=-1)
 @pass_context
@@ -903,10 +889,7 @@ def uninstall_tool(context,galaxy,repository,remove_from_disk,
                                             else '',
                                             toolshed))
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # Uninstall tool
     sys.exit(tools.uninstall_tool(gi,toolshed,repository,owner,revision,
                                   remove_from_disk=remove_from_disk,
@@ -948,10 +931,7 @@ def search_toolshed(context,toolshed,query_string,galaxy,long_listing):
         toolshed = "https://testtoolshed.g2.bx.psu.edu/"
     # Get a Galaxy instance, if specified
     if galaxy is not None:
-        gi = context.galaxy_instance(galaxy)
-        if gi is None:
-            logger.critical("Failed to connect to Galaxy instance")
-            sys.exit(1)
+        gi = context.connect(galaxy)
     else:
         gi = None
     # Search the toolshed
@@ -979,10 +959,7 @@ def list_libraries(context,galaxy,path,long_listing,show_id):
     'data_library[/folder[/subfolder[...]]]'
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # List folders in data library
     if path:
         sys.exit(libraries.list_library_contents(
@@ -1011,10 +988,7 @@ def create_library(context,galaxy,name,description,synopsis):
     with the same name must not already.
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # Create new data library
     libraries.create_library(gi,name,
                              description=description,
@@ -1039,10 +1013,7 @@ def create_library_folder(context,galaxy,path,description):
     not address an existing folder.
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # Create new folder
     if libraries.create_folder(gi,path,
                                description=description) is None:
@@ -1064,12 +1035,13 @@ def create_library_folder(context,galaxy,path,description):
               help="create symlinks to files on server (only "
               "valid if used with --server; default is to copy "
               "files into Galaxy)")
+@options.jobs_option('local files',default=libraries.UPLOAD_JOBS)
 @click.argument("galaxy")
 @click.argument("dest")
 @click.argument("file",nargs=-1)
 @pass_context
 def add_library_datasets(context,galaxy,dest,file,file_type,
-                         dbkey,from_server,link):
+                         dbkey,from_server,link,jobs):
     """
     Add datasets to a data library.
 
@@ -1081,17 +1053,17 @@ def add_library_datasets(context,galaxy,dest,file,file_type,
     'data_library[/folder[/subfolder[...]]]'. The library
     and folder must already exist.
     """
-    # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    # Get a Galaxy instance (the connection is checked when
+    # looking up the user, which is the first thing done
+    # when adding the datasets)
+    gi = context.connect(galaxy,check_connection=False)
     # Add the datasets
-    libraries.add_library_datasets(gi,dest,file,
-                                   from_server=from_server,
-                                   link_only=link,
-                                   file_type=file_type,
-                                   dbkey=dbkey)
+    sys.exit(libraries.add_library_datasets(gi,dest,file,
+                                            from_server=from_server,
+                                            link_only=link,
+                                            file_type=file_type,
+                                            dbkey=dbkey,
+                                            max_workers=jobs))
 
 @nebulizer.command(name="quotas")
 @click.option("--name",
@@ -1114,10 +1086,7 @@ def quotas(context,galaxy,name,status,long_listing):
     Prints details of quotas in GALAXY instance.
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # List users
     sys.exit(list_quotas(gi,name=name,
                          status=status,
@@ -1170,10 +1139,7 @@ def quota_add(context,galaxy,name,quota,description=None,
     quota with the -u/--users and -g/--groups options.
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # Deal with quota specification
     operation,amount = handle_quota_spec(quota)
     # Deal with description
@@ -1237,10 +1203,7 @@ def quota_mod(context,galaxy,quota,name=None,description=None,
     be restored and modified.
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # Deal with quota specification
     if quota_size:
         operation,amount = handle_quota_spec(quota_size)
@@ -1272,8 +1235,7 @@ def quota_mod(context,galaxy,quota,name=None,description=None,
 @nebulizer.command(name="quota_del")
 @click.argument("galaxy")
 @click.argument("quota")
-@click.option('-y','--yes',is_flag=True,
-              help="don't ask for confirmation of deletions.")
+@options.no_confirm_option('deletions')
 @pass_context
 def quota_del(context,galaxy,quota,yes):
     """
@@ -1282,10 +1244,7 @@ def quota_del(context,galaxy,quota,yes):
     Deletes QUOTA from GALAXY.
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy)
     # Delete quota
     sys.exit(delete_quota(gi,quota,no_confirm=yes))
 
@@ -1303,17 +1262,13 @@ def config(context,galaxy,name=None):
     GALAXY. Use --name to filter which items are reported.
     """
     # Get a Galaxy instance
-    gi = context.galaxy_instance(galaxy,validate_key=False)
-    if gi is None:
-        logger.critical("Failed to connect to Galaxy instance")
-        sys.exit(1)
+    gi = context.connect(galaxy,validate_key=False)
     # Fetch and report configuration
     config = get_galaxy_config(gi)
     items = sorted(config.keys())
     if name:
-        name = name.lower()
-        items = [item for item in items if fnmatch.fnmatch(item.lower(),
-                                                           name)]
+        name_match = compile_glob(name.lower())
+        items = [item for item in items if name_match(item.lower())]
     output = Reporter()
     for item in items:
         output.append((item,config[item]))
@@ -1339,27 +1294,24 @@ def ping(context,galaxy,count,interval=5,timeout=None):
     response and the time taken.
     """
     try:
-        galaxy_url,_ = Credentials().fetch_key(galaxy)
+        galaxy_url,_ = get_credentials().fetch_key(galaxy)
     except KeyError:
         galaxy_url = galaxy
     click.echo("PING %s" % galaxy_url)
+    # Get a Galaxy instance (the pings check the connection)
+    gi = context.galaxy_instance(galaxy_url,validate_key=False,
+                                 check_connection=False)
     nrequests = 0
     timeout_timer = 0
     while True:
         try:
-            # Get a Galaxy instance
-            gi = context.galaxy_instance(galaxy_url,validate_key=False)
-            if gi is None:
-                click.echo("%s: failed to connect" % galaxy_url)
-                status_code = 1
+            status_code,response_time = ping_galaxy_instance(gi)
+            if status_code != 0:
+                msg = "failed (error code %s)" % status_code
             else:
-                status_code,response_time = ping_galaxy_instance(gi)
-                if status_code != 0:
-                    msg = "failed (error code %s)" % status_code
-                else:
-                    msg = "ok"
-                click.echo("%s: status = %s time = %.3f (ms)" %
-                           (galaxy_url,msg,response_time*1000.0))
+                msg = "ok"
+            click.echo("%s: status = %s time = %.3f (ms)" %
+                       (galaxy_url,msg,response_time*1000.0))
             # Deal with count limit, if set
             if count != 0:
                 nrequests += 1
@@ -5,14 +5,65 @@
 import sys
 import os
 import re
+import shutil
 import fnmatch
+import posixpath
 import logging
 import time
+from http.cookiejar import DefaultCookiePolicy
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+from urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.retry import Retry
+import bioblend.galaxyclient
 from bioblend import galaxy
 from bioblend.galaxy.client import ConnectionError
+try:
+    # Optional faster JSON parser for API responses
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# Settings for the HTTP connection pool shared by Galaxy API calls
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 16
+HTTP_MAX_RETRIES = 3
+HTTP_RETRY_BACKOFF = 0.3
+HTTP_RETRY_STATUSES = (429,502,503,504)
+HTTP_RETRY_METHODS = ('GET','HEAD')
+
+# Default number of details requests to make concurrently
+FETCH_JOBS = 8
+
+# Responses accepted by 'prompt_for_confirmation'
+CONFIRMATION_RESPONSES = {
+    'yes': True,
+    'ye' : True,
+    'y'  : True,
+    'no' : False,
+    'n'  : False,
+}
+# Prompts for each type of default response
+CONFIRMATION_PROMPTS = {
+    None: " [y/n] ",
+    'y' : " [Y/n] ",
+    'n' : " [y/N] ",
+}
+
+# Set once the urllib3 warnings have been turned off
+_urllib3_warnings_disabled = False
+
+# Credentials shared within a session (see 'get_credentials')
+_credentials = None
+
+# HTTP session used to ping Galaxy (see 'get_ping_session')
+_ping_session = None
+
 class Credentials:
     """Class for managing credentials for Galaxy instances
 
@@ -26,6 +77,11 @@ class Credentials:
 
     Blank lines or lines starting '#' are skipped.
 
+    The file is read when the keys are first needed, and
+    only read again if it has since been modified by
+    something else; changes made through the same instance
+    are applied to both the file and the stored keys.
+
     """
 
     def __init__(self,key_file=None):
@@ -42,6 +98,126 @@ class Credentials:
             key_file = os.path.join(os.path.expanduser("~"),
                                     '.nebulizer')
         self._key_file = os.path.abspath(key_file)
+        self._keys = None
+        self._keys_status = None
+
+    def _iter_entries(self):
+        """
+        Internal: iterate over the entries in the key file
+
+        The file is read in a single operation (and closed
+        before any entries are returned); bad lines are
+        skipped with a warning.
+
+        Yields:
+          Tuple: (ALIAS,GALAXY_URL,API_KEY) for each entry,
+            in the order they appear in the file.
+        """
+        try:
+            with open(self._key_file) as fp:
+                lines = fp.read().splitlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            entry = self._parse_line(line)
+            if entry is None:
+                if line.strip() and not line.startswith('#'):
+                    logger.warning("%s: ignoring bad line '%s'",
+                                   self._key_file,line.strip())
+                continue
+            yield entry
+
+    def _parse_line(self,line):
+        """
+        Internal: extract the entry from a line in the key file
+
+        Arguments:
+          line (str): line from the key file
+
+        Returns:
+          Tuple: (ALIAS,GALAXY_URL,API_KEY) for the entry, or
+            None if the line is blank, a comment or not a
+            valid entry.
+        """
+        if line.startswith('#'):
+            return None
+        try:
+            alias,url,api_key = line.strip().split('\t',2)
+        except ValueError:
+            return None
+        return (alias,url,api_key)
+
+    def _key_file_status(self):
+        """
+        Internal: get the modification time and size of the key file
+
+        Returns:
+          Tuple: (MTIME_NS,SIZE) for the key file, or None if
+            the file doesn't exist.
+        """
+        try:
+            st = os.stat(self._key_file)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns,st.st_size)
+
+    def _load_keys(self):
+        """
+        Internal: read the key file into an index
+
+        The file is only read again if its modification
+        time or size has changed since it was last read.
+
+        Returns:
+          Dictionary: mapping aliases to (GALAXY_URL,API_KEY)
+            tuples, in the order they appear in the file.
+        """
+        status = self._key_file_status()
+        if self._keys is None or status != self._keys_status:
+            self._keys = {}
+            for alias,url,api_key in self._iter_entries():
+                self._keys.setdefault(alias,(url,api_key))
+            self._keys_status = status
+        return self._keys
+
+    def _rewrite_key_file(self,name,entry=None):
+        """
+        Internal: rewrite the key file without an alias
+
+        Lines for the alias are dropped, except that the
+        first one is replaced by 'entry' (if supplied); all
+        other lines are copied unchanged. The new file is
+        written to a temporary file (created readable only by
+        the owner, then given the same permissions as the key
+        file) which then replaces the key file.
+
+        Arguments:
+          name (str): alias of the key entry to rewrite
+          entry (str): optional, line to replace the first
+            entry for the alias with
+        """
+        with open(self._key_file) as fp:
+            lines = []
+            for line in fp:
+                line_entry = self._parse_line(line)
+                if line_entry is not None and line_entry[0] == name:
+                    if entry is not None:
+                        lines.append(entry)
+                        entry = None
+                    continue
+                lines.append(line)
+        tmp_key_file = self._key_file + '.tmp'
+        try:
+            fd = os.open(tmp_key_file,
+                         os.O_WRONLY|os.O_CREAT|os.O_TRUNC,0o600)
+            with open(fd,'w') as fp_tmp:
+                fp_tmp.writelines(lines)
+            shutil.copymode(self._key_file,tmp_key_file)
+            os.replace(tmp_key_file,self._key_file)
+        except Exception:
+            if os.path.exists(tmp_key_file):
+                os.unlink(tmp_key_file)
+            raise
 
     def list_keys(self):
         """
@@ -51,14 +227,7 @@ class Credentials:
           List: list of aliases.
 
         """
-        key_names = []
-        if os.path.exists(self._key_file):
-            with open(self._key_file) as fp:
-                for line in fp:
-                    if line.startswith('#') or not line.strip():
-                        continue
-                    key_names.append(line.strip().split('\t')[0])
-        return key_names
+        return list(self._load_keys())
 
     def store_key(self,name,url,api_key):
         """
@@ -77,15 +246,19 @@ class Credentials:
         if not api_key:
             logger.warning("Empty API key")
             return False
+        keys = self._load_keys()
         with open(self._key_file,'a') as fp:
             fp.write(f"{name}\t{url}\t{api_key}\n")
+        keys.setdefault(name,(url,api_key))
+        self._keys_status = self._key_file_status()
         return True
 
     def remove_key(self,name):
         """
         Remove a Galaxy API key
 
-        Removes a key entry from the key file.
+        Removes a key entry from the key file; other
+        entries (and any comments) are left unchanged.
 
         Arguments:
           name (str) alias of the key to be removed
@@ -93,30 +266,22 @@ class Credentials:
         Returns:
           Boolean: True if key was removed, False on error.
         """
-        key_names = self.list_keys()
-        if name not in key_names:
-            logger.error("'%s': not found" % name)
+        keys = self._load_keys()
+        if name not in keys:
+            logger.error("'%s': not found",name)
             return False
-        # Store the keys
-        cached_keys = {
-            name: list(self.fetch_key(name))
-            for name in key_names
-        }
-        # Wipe the key file
-        with open(self._key_file,'w') as fp:
-            fp.write("#.nebulizer\n#Aliases\tGalaxy URL\tAPI key\n")
-        # Store the cached keys again
-        for alias in key_names:
-            if name != alias:
-                url,api_key = cached_keys[alias]
-                self.store_key(alias,url,api_key)
+        self._rewrite_key_file(name)
+        del keys[name]
+        self._keys_status = self._key_file_status()
         return True
 
     def update_key(self,name,new_url=None,new_api_key=None):
         """
         Update a Galaxy API key
 
-        Updates the stored information in the key file.
+        Updates the stored information in the key file; the
+        entry keeps its position in the file, and other
+        entries (and any comments) are left unchanged.
 
         Arguments:
           name (str): alias of the key entry to be updated
@@ -128,17 +293,18 @@ class Credentials:
         Returns:
           Boolean: True if key was updated, False on error.
         """
-        try:
-            url,api_key = self.fetch_key(name)
-        except KeyError:
-            logger.error("'%s': not found" % name)
+        keys = self._load_keys()
+        if name not in keys:
+            logger.error("'%s': not found",name)
             return False
+        url,api_key = keys[name]
         if new_url:
             url = new_url
         if new_api_key:
             api_key = new_api_key
-        self.remove_key(name)
-        self.store_key(name,url,api_key)
+        self._rewrite_key_file(name,entry=f"{name}\t{url}\t{api_key}\n")
+        keys[name] = (url,api_key)
+        self._keys_status = self._key_file_status()
         return True
 
     def fetch_key(self,name):
@@ -157,25 +323,30 @@ class Credentials:
         Returns:
           Tuple: consisting of (GALAXY_URL,API_KEY)
         """
-        if os.path.exists(self._key_file):
-            with open(self._key_file) as fp:
-                for line in fp:
-                    if line.startswith('#') or not line.strip():
-                        continue
-                    alias,url,api_key = line.strip().split('\t')
-                    if alias == name or url == name:
-                        return (url,api_key)
+        keys = self._load_keys()
+        try:
+            return keys[name]
+        except KeyError:
+            # Try matching against the URLs instead
+            for url,api_key in keys.values():
+                if url == name:
+                    return (url,api_key)
         raise KeyError("'%s': not found" % name)
 
     def has_key(self,name):
         """
         Check if alias exists
+
+        Arguments:
+          name (str): alias (or Galaxy URL) to look for
+
+        Returns:
+          Boolean: True if there is a matching entry, False
+            otherwise.
         """
-        try:
-            self.fetch_key(name)
-            return True
-        except KeyError:
-            return False
+        keys = self._load_keys()
+        return name in keys or \
+            any(url == name for url,_ in keys.values())
 
 class Reporter:
     """
@@ -207,13 +378,16 @@ class Reporter:
           line (list): list of data items to
             append
         """
+        # Store the items as strings, and update the
+        # maximum width of each field
+        line = [str(item) for item in line]
         self._content.append(line)
+        widths = self._field_widths
         for ix,item in enumerate(line):
-            try:
-                self._field_widths[ix] = max(self._field_widths[ix],
-                                            len(str(item)))
-            except IndexError:
-                self._field_widths.append(len(str(item)))
+            if ix == len(widths):
+                widths.append(len(item))
+            elif len(item) > widths[ix]:
+                widths[ix] = len(item)
     @property
     def nlines(self):
         """
@@ -234,38 +408,192 @@ class Reporter:
           rstrip (bool): if True then strip all trailing
             whitespace from lines
         """
-        output = []
+        if not self._content:
+            # Nothing to report
+            return
         if delimiter is None:
             delimiter = '  '
+        if not prefix:
+            prefix = ''
         if padding:
+            # Build a format string for each length of line,
+            # which pads all but the last field
+            formats = {}
+            out_lines = []
             for line in self._content:
-                # Apply padding to all but the last field
-                out_line = ["%-*s" % (width,str(item))
-                               for width,item
-                               in zip(self._field_widths[:-1],
-                                      line[:-1])]
-                # Add the final field with no padding
-                out_line.append(str(line[-1]))
-                output.append(out_line)
+                nitems = len(line)
+                try:
+                    fmt = formats[nitems]
+                except KeyError:
+                    fields = ["%%-%ds" % width
+                              for width in self._field_widths[:nitems-1]]
+                    if nitems:
+                        fields.append("%s")
+                    fmt = "%s%s" % (prefix.replace('%','%%'),
+                                    delimiter.replace('%','%%').join(fields))
+                    formats[nitems] = fmt
+                out_lines.append(fmt % tuple(line))
         else:
-            for line in self._content:
-                output.append([str(item) for item in line])
-        if not prefix:
-            prefix = ''
-        for line in output:
-            out_line = "{}{}".format(prefix,delimiter.join(line))
-            if rstrip:
-                out_line = out_line.rstrip()
-            print(out_line)
+            out_lines = ["{}{}".format(prefix,delimiter.join(line))
+                         for line in self._content]
+        if rstrip:
+            out_lines = [line.rstrip() for line in out_lines]
+        # Write all the lines at once
+        sys.stdout.write("%s\n" % '\n'.join(out_lines))
+
+class SharedSessionRequests:
+    """
+    Class routing bioblend HTTP requests through a single session
+
+    bioblend makes each Galaxy API call via the module-level
+    functions in 'requests' (e.g. 'requests.get'), which
+    open a new connection for every request. An instance of
+    this class stands in for the 'requests' module within
+    bioblend, sending those calls through a shared
+    'requests.Session' so that connections are kept alive
+    and reused; all other attributes are taken from the
+    real 'requests' module.
+
+    Use the 'use_shared_http_session' function rather than
+    instantiating this class directly.
+    """
+    def __init__(self,session):
+        """
+        Create a new SharedSessionRequests instance
+
+        Arguments:
+          session (requests.Session): session to send
+            requests through
+        """
+        self.session = session
+
+    def __getattr__(self,attr):
+        if attr in ('get','post','put','patch','delete'):
+            return getattr(self.session,attr)
+        return getattr(requests,attr)
+
+def _parse_json_with_orjson(response,*args,**kwargs):
+    """
+    Response hook which parses JSON bodies using 'orjson'
+
+    Replaces the 'json' method of the response with one
+    which decodes the body using 'orjson' (falling back
+    to the standard method if any arguments are supplied).
+
+    Arguments:
+      response (requests.Response): response to update
+
+    Returns:
+      requests.Response: the updated response.
+    """
+    def parse_json(**kwargs):
+        if kwargs:
+            return requests.Response.json(response,**kwargs)
+        return orjson.loads(response.content)
+    response.json = parse_json
+    return response
+
+def use_shared_http_session():
+    """
+    Send all bioblend API calls through a shared HTTP session
+
+    Creates a 'requests.Session' with a connection pool
+    (on the first call only) and installs it into bioblend,
+    so that subsequent API calls reuse existing connections
+    instead of making a new connection for each request.
+
+    NB this affects every bioblend GalaxyInstance in the
+    process, so it should only be called by the command
+    line entry point. The session never stores or sends
+    cookies (so none can be passed between different
+    Galaxy instances or users).
+
+    Failed connections are retried with an increasing
+    delay between attempts (requests which might have
+    reached the server are only retried if they only
+    fetch data, see 'HTTP_RETRY_METHODS'). These requests
+    are also retried when the server is throttling or
+    temporarily unavailable (see 'HTTP_RETRY_STATUSES');
+    if every attempt fails then the last response is
+    returned.
+
+    If 'orjson' is installed then it is used to parse
+    the JSON returned by the API.
+
+    Returns:
+      requests.Session: the shared session.
+    """
+    if not isinstance(bioblend.galaxyclient.requests,
+                      SharedSessionRequests):
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        retry_settings = dict(total=HTTP_MAX_RETRIES,
+                              backoff_factor=HTTP_RETRY_BACKOFF,
+                              status_forcelist=HTTP_RETRY_STATUSES,
+                              raise_on_status=False)
+        try:
+            retries = Retry(allowed_methods=frozenset(HTTP_RETRY_METHODS),
+                            **retry_settings)
+        except TypeError:
+            # Older urllib3 (pre-1.26)
+            retries = Retry(method_whitelist=frozenset(HTTP_RETRY_METHODS),
+                            **retry_settings)
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS,
+                              pool_maxsize=HTTP_POOL_MAXSIZE,
+                              max_retries=retries)
+        session.mount('http://',adapter)
+        session.mount('https://',adapter)
+        if orjson is not None:
+            session.hooks['response'].append(_parse_json_with_orjson)
+        bioblend.galaxyclient.requests = SharedSessionRequests(session)
+    return bioblend.galaxyclient.requests.session
+
+def get_ping_session():
+    """
+    Return the HTTP session used to ping Galaxy instances
+
+    The session is separate from the one shared by the API
+    calls (see 'use_shared_http_session') and never retries
+    requests, so that each ping sends a single request and
+    reports the status and time for that request.
+
+    Returns:
+      requests.Session: the ping session.
+    """
+    global _ping_session
+    if _ping_session is None:
+        _ping_session = requests.Session()
+        adapter = HTTPAdapter(max_retries=0)
+        _ping_session.mount('http://',adapter)
+        _ping_session.mount('https://',adapter)
+    return _ping_session
+
+def get_credentials():
+    """
+    Return the Credentials for the default key file
+
+    The same Credentials instance is returned on every
+    call, so that the default credentials file is only
+    read once however many times the keys are needed.
+
+    Returns:
+      Credentials: shared instance for $HOME/.nebulizer
+    """
+    global _credentials
+    if _credentials is None:
+        _credentials = Credentials()
+    return _credentials
 
 def get_galaxy_instance(galaxy_url,api_key=None,email=None,password=None,
-                        verify_ssl=True,validate_key=True):
+                        verify_ssl=True,validate_key=True,
+                        check_connection=True):
     """
     Return Bioblend GalaxyInstance
 
     Attempts to connect to the specified Galaxy instance and
     verify that the connection is working by requesting the
-    config for that instance.
+    config for that instance (unless 'check_connection' is
+    turned off).
 
     Arguments:
       galaxy_url (str): URL for the Galaxy instance to connect to
@@ -274,23 +602,30 @@ def get_galaxy_instance(galaxy_url,api_key=None,email=None,password=None,
         (alternative to api_key; also need to supply a password)
       password (str): password of Galaxy account corresponding to
         email address (alternative to api_key)
-      verify_ssl (bool): if True then turn off verification of SSL
-        certificates for HTTPs connections
+      verify_ssl (bool): if False then turn off verification of SSL
+        certificates for HTTPs connections (and the associated
+        warnings from urllib3)
+      check_connection (bool): if False then don't make any
+        requests to verify the connection (use when the first
+        API call made by the caller will fail in the same way)
 
     Returns:
       GalaxyInstance: a bioblend GalaxyInstance for the connection,
         or None if the connection failed or couldn't be verified.
 
     """
-    try:
-        galaxy_url,stored_key = Credentials().fetch_key(galaxy_url)
-    except KeyError as ex:
-        logger.debug("Failed to find credentials for %s" %
-                     galaxy_url)
-        stored_key = None
-    if api_key is None:
-        api_key = stored_key
-    logger.debug("Connecting to %s" % galaxy_url)
+    # Look up stored credentials (unless both a full URL
+    # and an API key were supplied)
+    if api_key is None or '://' not in galaxy_url:
+        try:
+            galaxy_url,stored_key = get_credentials().fetch_key(galaxy_url)
+        except KeyError as ex:
+            logger.debug("Failed to find credentials for %s",
+                         galaxy_url)
+            stored_key = None
+        if api_key is None:
+            api_key = stored_key
+    logger.debug("Connecting to %s",galaxy_url)
     if not validate_key:
         gi = galaxy.GalaxyInstance(url=galaxy_url)
     elif email is not None:
@@ -299,48 +634,99 @@ def get_galaxy_instance(galaxy_url,api_key=None,email=None,password=None,
     else:
         gi = galaxy.GalaxyInstance(url=galaxy_url,key=api_key)
     gi.verify = verify_ssl
-    if not get_galaxy_config(gi):
+    if not verify_ssl:
+        turn_off_urllib3_warnings()
+    if not check_connection:
+        return gi
+    if email is not None:
+        # Fetch the API key for the account now: bioblend
+        # does this lazily (and without locking) so otherwise
+        # each of the requests below would fetch it separately
+        try:
+            api_key = gi.key
+        except Exception as ex:
+            logger.error("Failed to fetch API key for %s: %s",
+                         email,ex)
+            return None
+    # Request the config and the user data concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        config = executor.submit(get_galaxy_config,gi)
+        user = executor.submit(get_current_user,gi)
+    if not config.result():
         return None
-    user = get_current_user(gi)
+    user = user.result()
     if user is not None:
-        logger.debug("Connected as user %s" % user['email'])
+        logger.debug("Connected as user %s",user['email'])
     else:
         logger.debug("Unable to determine associated user")
     return gi
 
-def get_galaxy_config(gi):
+def instance_store(gi,name):
+    """
+    Return a named store for data held on a Galaxy instance
+
+    The store is a dictionary which is created on the first
+    call for each name and returned by subsequent calls, so
+    that concurrent callers share the same store.
+
+    Arguments:
+      gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      name (str): name of the store (e.g. 'groups')
+
+    Returns:
+      Dictionary: the store for the Galaxy instance.
+    """
+    return gi.__dict__.setdefault('_nebulizer_%s' % name,{})
+
+def get_galaxy_config(gi,force=False):
     """
     Requests configuration data for a Galaxy instance
 
+    The data from the first successful request is stored
+    on the Galaxy instance and returned by subsequent
+    calls, unless 'force' is set.
+
     Arguments:
       gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      force (bool): if True then always request the data
+        from Galaxy, rather than returning stored data
 
     Returns:
       Dictionary: the configuration data for the Galaxy
         instance (will be empty if this couldn't be
         retrieved)
     """
-    try:
-        return galaxy.config.ConfigClient(gi).get_config()
-    except ConnectionError as ex:
-        print(ex)
-        return {}
+    if force or getattr(gi,'_nebulizer_config',None) is None:
+        try:
+            gi._nebulizer_config = galaxy.config.ConfigClient(gi).get_config()
+        except ConnectionError as ex:
+            print(ex)
+            return {}
+    return gi._nebulizer_config
 
-def get_current_user(gi):
+def get_current_user(gi,force=False):
     """
     Requests data on the user for an API connection
 
+    The data from the first successful request is stored
+    on the Galaxy instance and returned by subsequent
+    calls, unless 'force' is set.
+
     Arguments:
       gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      force (bool): if True then always request the data
+        from Galaxy, rather than returning stored data
 
     Returns:
       Dictionary: the data on the user, or 'None' if the user
         couldn't be determined.
     """
-    try:
-        return galaxy.users.UserClient(gi).get_current_user()
-    except ConnectionError:
-        return None
+    if force or getattr(gi,'_nebulizer_user',None) is None:
+        try:
+            gi._nebulizer_user = galaxy.users.UserClient(gi).get_current_user()
+        except ConnectionError:
+            return None
+    return gi._nebulizer_user
 
 def ping_galaxy_instance(gi):
     """
@@ -357,16 +743,80 @@ def ping_galaxy_instance(gi):
         be sent and the response to be received, in seconds.
 
     """
-    # Make a request
+    # Make a single request (bypassing the retries of the
+    # shared session)
+    session = get_ping_session()
     try:
-        start = time.time()
-        galaxy.config.ConfigClient(gi).get_config()
-        retcode = 0
-    except ConnectionError as ex:
-        retcode = ex.status_code
-    end = time.time()
+        start = time.perf_counter()
+        r = session.get("%s/configuration" % gi.url,
+                        params=gi.default_params,
+                        headers=gi.json_headers,
+                        verify=gi.verify,
+                        timeout=gi.timeout)
+        if r.status_code == 200:
+            retcode = 0
+        else:
+            retcode = r.status_code
+    except requests.exceptions.RequestException:
+        retcode = None
+    end = time.perf_counter()
     return (retcode,end-start)
 
+@lru_cache(maxsize=256)
+def compile_glob(pattern):
+    """
+    Compile a glob-style pattern for repeated matching
+
+    Translates a glob-style pattern (which can include the
+    same wildcards as 'fnmatch') into a compiled regular
+    expression, so that it can be matched against many
+    strings without being reprocessed each time.
+
+    Compiled patterns are cached, so calling this again
+    with the same pattern returns the same function.
+
+    As with 'fnmatch.fnmatch', the pattern and the strings
+    are normalised using 'os.path.normcase' (so matching is
+    case-insensitive on Windows).
+
+    Arguments:
+      pattern (str): glob-style pattern
+
+    Returns:
+      Function: the 'match' method of the compiled pattern
+        (returns a match object if the supplied string
+        matches the pattern, None otherwise), or None if
+        no pattern was supplied.
+    """
+    if not pattern:
+        return None
+    match = re.compile(fnmatch.translate(os.path.normcase(pattern))).match
+    if os.path.normcase is posixpath.normcase:
+        # Strings don't need to be normalised
+        return match
+    return lambda name: match(os.path.normcase(name))
+
+def glob_prefix(pattern):
+    """
+    Return the literal prefix of a glob-style pattern
+
+    The prefix is the part of the pattern before the first
+    wildcard; any string which matches the pattern must
+    start with this prefix, so it can be used to discard
+    non-matching strings before doing a full match.
+
+    Arguments:
+      pattern (str): glob-style pattern
+
+    Returns:
+      String: the literal prefix (the whole pattern if
+        there are no wildcards).
+    """
+    wildcards = [pattern.index(c) for c in "*?[" if c in pattern]
+    if not wildcards:
+        return pattern
+    return pattern[:min(wildcards)]
+
 def prompt_for_confirmation(question,default=None):
     """
     Prompt the user to confirm an action
@@ -381,29 +831,19 @@ def prompt_for_confirmation(question,default=None):
       True if user confirms, False if not.
 
     """
-    responses = {
-        'yes': True,
-        'ye' : True,
-        'y'  : True,
-        'no' : False,
-        'n'  : False,
-    }
-    if default is None:
-        prompt = " [y/n] "
-    elif default.lower().startswith('y'):
-        prompt = " [Y/n] "
-    elif default.lower().startswith('n'):
-        prompt = " [y/N] "
-    else:
+    key = default[:1].lower() if default is not None else None
+    try:
+        prompt = CONFIRMATION_PROMPTS[key]
+    except KeyError:
         raise Exception("Invalid default for prompt: %s" %
                         default)
     while True:
         sys.stdout.write(question + prompt)
         choice = input().lower()
-        if default is not None and choice == '':
-            return responses[default.lower()]
-        elif choice in responses:
-            return responses[choice]
+        if key is not None and choice == '':
+            return CONFIRMATION_RESPONSES[key]
+        elif choice in CONFIRMATION_RESPONSES:
+            return CONFIRMATION_RESPONSES[choice]
         else:
             sys.stdout.write("Please respond with 'yes' or 'no' "
                              "(or 'y' or 'n').\n")
@@ -412,10 +852,15 @@ def turn_off_urllib3_warnings():
     """
     Turn off the warnings from urllib3
 
-    Use this to suppress warnings (e.g. about unverified HTTPS
-    certificates) that would otherwise be written out for each
-    request in bioblend.
+    Use this to suppress the warnings about unverified HTTPS
+    requests that would otherwise be written out for each
+    request in bioblend when SSL verification is turned off.
+
+    The warnings are only turned off on the first call;
+    subsequent calls do nothing.
 
     """
-    import requests
-    requests.packages.urllib3.disable_warnings()
+    global _urllib3_warnings_disabled
+    if not _urllib3_warnings_disabled:
+        urllib3.disable_warnings(InsecureRequestWarning)
+        _urllib3_warnings_disabled = True
@@ -2,12 +2,14 @@
 #
 # groups: functions for managing groups
 import logging
-from bioblend import galaxy
+from concurrent.futures import ThreadPoolExecutor
+from .core import FETCH_JOBS
+from .core import instance_store
 
 # Logging
 logger = logging.getLogger(__name__)
 
-class Group(object):
+class Group:
     """
     Class wrapping extraction of group data
 
@@ -15,7 +17,19 @@ class Group(object):
     in a Galaxy instance, which has been retrieved via a
     a call to the Galaxy API using bioblend.
 
+    Only the data items returned by Galaxy for a group
+    (i.e. those listed in '__slots__') are stored.
+
     """
+    # Data items returned by Galaxy for a group
+    __slots__ = ('id',
+                 'name',
+                 'model_class',
+                 'url',
+                 'roles_url',
+                 'users_url',)
+    _FIELDS = frozenset(__slots__)
+
     def __init__(self,group_data):
         """
         Create a new Group instance
@@ -43,37 +57,98 @@ class Group(object):
         >>> group.update(galaxy.groups.GroupClient(gi).show_group(group.id))
 
         """
-        # Check this is the same user ID
+        # Check this is the same group ID
         if group_data['id'] != self.id:
-            raise Exception("Tried to update data for user ID '%s' "
-                            "with data for user ID '%s'" %
+            raise Exception("Tried to update data for group ID '%s' "
+                            "with data for group ID '%s'" %
                             (self.id,
                              group_data['id']))
-        # Update the attributes
-        for attr in group_data.keys():
-            try:
-                setattr(self,attr,group_data[attr])
-            except AttributeError:
-                pass
+        # Update the known attributes
+        for k in self._FIELDS.intersection(group_data):
+            setattr(self,k,group_data[k])
 
 # Functions
 
-def get_groups(gi):
+def get_groups(gi,details=True,max_workers=FETCH_JOBS):
     """
     Return list of groups in a Galaxy instance
 
+    By default the full details of each group are fetched
+    (concurrently); if only the basic group data (i.e. the
+    IDs and names) are needed then set 'details' to False
+    to avoid the additional requests.
+
+    Use 'iter_groups' to process the groups as they are
+    fetched.
+
     Arguments:
       gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      details (bool): if True (the default) then fetch the
+        full details of each group
+      max_workers (int): maximum number of requests for
+        group details to make concurrently (default is 8)
 
     Returns:
       list: list of Group objects.
 
     """
-    groups = []
-    group_client = galaxy.groups.GroupsClient(gi)
-    # Get (undeleted) groups
-    for group_data in group_client.get_groups():
-        group = Group(group_data)
-        group.update(group_client.show_group(group.id))
-        groups.append(group)
-    return groups
+    return list(iter_groups(gi,details=details,max_workers=max_workers))
+
+def iter_groups(gi,details=True,max_workers=FETCH_JOBS):
+    """
+    Iterate over the groups in a Galaxy instance
+
+    Groups are yielded in the same order as they are
+    listed by Galaxy, each one as soon as its details are
+    available (while the details for later groups are
+    still being fetched). Outstanding requests are
+    cancelled if iteration stops early.
+
+    Arguments:
+      gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      details (bool): if True (the default) then fetch the
+        full details of each group
+      max_workers (int): maximum number of requests for
+        group details to make concurrently (default is 8)
+
+    Yields:
+      Group: Group object for each group.
+
+    """
+    # Get (undeleted) groups (using the GroupsClient which
+    # is created along with the Galaxy instance)
+    group_list = gi.groups.get_groups()
+    if not details:
+        for group_data in group_list:
+            yield Group(group_data)
+        return
+    # Create the groups from the full details for each one
+    def get_details(group_id):
+        return get_group_data(gi,group_id)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for group_data in executor.map(get_details,
+                                       [g['id'] for g in group_list]):
+            yield Group(group_data)
+
+def get_group_data(gi,group_id,force=False):
+    """
+    Return the full details for a group
+
+    The data from the first successful request for each
+    group is stored on the Galaxy instance and returned
+    by subsequent calls, unless 'force' is set.
+
+    Arguments:
+      gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      group_id (str): ID of the group
+      force (bool): if True then always request the data
+        from Galaxy, rather than returning stored data
+
+    Returns:
+      Dictionary: the data for the group.
+
+    """
+    group_data = instance_store(gi,'groups')
+    if force or group_id not in group_data:
+        group_data[group_id] = gi.groups.show_group(group_id)
+    return group_data[group_id]
@@ -3,14 +3,21 @@
 # libraries: functions for managing data libraries
 import logging
 import os
-import fnmatch
+from bioblend.galaxy.client import ConnectionError
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from .core import get_current_user
+from .core import compile_glob
+from .core import glob_prefix
 from .core import Reporter
-from bioblend import galaxy
-import logging
+from .core import FETCH_JOBS
+from .core import instance_store
 
 logger = logging.getLogger(__name__)
 
+# Default number of files to upload concurrently
+UPLOAD_JOBS = 1
+
 def list_data_libraries(gi,long_listing_format=False,show_id=False):
     """
     Return list of data libraries
@@ -24,7 +31,7 @@ def list_data_libraries(gi,long_listing_format=False,show_id=False):
 
     """
     output = Reporter()
-    libraries = sorted(galaxy.libraries.LibraryClient(gi).get_libraries(),
+    libraries = sorted(gi.libraries.get_libraries(),
                        key=lambda lib: lib['name'])
     for lib in libraries:
         display_items = [lib['name']]
@@ -44,6 +51,9 @@ def library_id_from_name(gi,library_name):
     """
     Fetch ID for data library from library name
 
+    IDs which are found are stored on the Galaxy instance
+    and returned by subsequent calls for the same name.
+
     Arguments:
       gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
       library_name (str): name of data library to look up
@@ -52,16 +62,23 @@ def library_id_from_name(gi,library_name):
       str: ID for data library, or None if name not found.
 
     """
-    try:
-        return galaxy.libraries.LibraryClient(gi).get_libraries(
-            name=library_name)[0]['id']
-    except IndexError:
-        return None
+    library_ids = instance_store(gi,'library_ids')
+    if library_name not in library_ids:
+        try:
+            library_ids[library_name] = \
+                gi.libraries.get_libraries(name=library_name)[0]['id']
+        except IndexError:
+            return None
+    return library_ids[library_name]
 
 def folder_id_from_name(gi,library_id,folder_name):
     """
     Fetch ID for folder
 
+    The folders in each library are only fetched once (see
+    'get_folder_index') and subsequent calls look up the
+    folder in the stored index.
+
     Arguments:
       gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
       library_id (str): ID for parent data library
@@ -71,15 +88,63 @@ def folder_id_from_name(gi,library_id,folder_name):
       str: ID for folder, or None if name not found.
 
     """
-    lib_client = galaxy.libraries.LibraryClient(gi)
     folder_name = normalise_folder_path(folder_name)
     logger.debug("Looking for '{}' in library {}".format(folder_name,
                                                       library_id))
-    for folder in lib_client.get_folders(library_id):
-        logger.debug("Checking '%s'" % folder['name'])
-        if folder['name'] == folder_name:
-            return folder['id']
-    return None
+    return get_folder_index(gi,library_id).get(folder_name)
+
+def get_folder_index(gi,library_id):
+    """
+    Return index of folder IDs for a data library
+
+    The folders are fetched from Galaxy on the first call
+    for each library; the index is stored on the Galaxy
+    instance and returned by subsequent calls (and should
+    be updated when new folders are created).
+
+    Arguments:
+      gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      library_id (str): ID for the data library
+
+    Returns:
+      Dictionary: mapping of normalised folder paths to
+        folder IDs.
+
+    """
+    folder_indexes = instance_store(gi,'folders')
+    if library_id not in folder_indexes:
+        folder_indexes[library_id] = {
+            folder['name']: folder['id']
+            for folder in gi.libraries.get_folders(library_id) }
+    return folder_indexes[library_id]
+
+def get_library_item_details(gi,library_id,items,max_workers=FETCH_JOBS):
+    """
+    Fetch the details for folders and datasets in a library
+
+    The details are requested concurrently.
+
+    Arguments:
+      gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      library_id (str): ID for the parent data library
+      items (list): list of dictionaries for library
+        folders and datasets, as returned when getting the
+        contents of the library
+      max_workers (int): maximum number of requests for
+        details to make concurrently (default is 8)
+
+    Returns:
+      Dictionary: mapping of item IDs to the details
+        returned by Galaxy for each item.
+
+    """
+    def get_details(item):
+        if item['type'] == 'folder':
+            return gi.libraries.show_folder(library_id,item['id'])
+        return gi.datasets.show_dataset(item['id'],hda_ldda='ldda')
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip([item['id'] for item in items],
+                        executor.map(get_details,items)))
 
 def list_library_contents(gi,path,long_listing_format=False,
                           show_id=False):
@@ -103,7 +168,7 @@ def list_library_contents(gi,path,long_listing_format=False,
     """
     # Get name and id for parent data library
     logger.debug("Path '%s'" % path)
-    lib_client = galaxy.libraries.LibraryClient(gi)
+    lib_client = gi.libraries
     library_name,folder_path = split_library_path(path)
     logger.debug("library_name '%s'" % library_name)
     library_id = library_id_from_name(gi,library_name)
@@ -113,21 +178,17 @@ def list_library_contents(gi,path,long_listing_format=False,
     # Get library contents
     library_contents = lib_client.show_library(library_id,contents=True)
     logger.debug("folder_path '%s'" % folder_path)
-    # Bioblend class for getting more info for datasets if
-    # using a long listing format
-    dataset_client = galaxy.datasets.DatasetClient(gi)
+    # Index the contents by parent folder (the parent of
+    # top-level items is the root folder '/')
+    contents_by_parent = {}
+    for x in library_contents:
+        contents_by_parent.setdefault(x['name'].rpartition('/')[0] or '/',
+                                      []).append(x)
     # Determine if we're matching against a wildcard pattern
     pattern = folder_path
-    wildcard_pattern = False
-    for c in "*?[]":
-        try:
-            pattern.index(c)
-            wildcard_pattern = True
-        except ValueError:
-            pass
+    wildcard_pattern = any(c in pattern for c in "*?[]")
     # Output mode depends on whether we have wildcards
     if not wildcard_pattern:
-        output = Reporter()
         # Exact matches only
         matches = [x for x in library_contents if x['name'] == pattern]
         if not matches:
@@ -136,99 +197,67 @@ def list_library_contents(gi,path,long_listing_format=False,
             return
         for item in matches:
             if item['type'] == 'folder':
-                contents = [x for x in library_contents if
-                            os.path.split(x['name'])[0] == item['name']]
+                contents = contents_by_parent.get(item['name'],[])
             else:
                 contents = matches
         # Remove 'root' folder
         contents = [x for x in contents if x['name'] != '/']
-        for item in contents:
-            if item['type'] == 'folder':
-                output.append(report_folder(
-                    lib_client.show_folder(library_id,
-                                           item['id']),
-                    long_listing=long_listing_format,
-                    show_id=show_id))
-            else:
-                output.append(report_dataset(
-                    item['id'],
-                    dataset_client.show_dataset(item['id'],
-                                                hda_ldda='ldda'),
-                    long_listing=long_listing_format,
-                    show_id=show_id))
+        # Fetch more info for the folders and datasets
+        details = get_library_item_details(gi,library_id,contents)
         # Report
-        output.report()
+        report_library_items(contents,details,
+                             long_listing=long_listing_format,
+                             show_id=show_id).report()
         print("total %s" % len(contents))
     else:
-        output = Reporter()
         # Number of levels to match
         nlevels = pattern.count('/')
-        # Mixture of matches possible
+        # Mixture of matches possible (check the literal
+        # prefix and number of levels first, as these are
+        # cheaper than the pattern match)
+        prefix = os.path.normcase(glob_prefix(pattern))
+        pattern_match = compile_glob(pattern)
         matches = [x for x in library_contents
-                   if (fnmatch.fnmatch(x['name'],pattern) and
-                       x['name'].count('/') == nlevels)]
+                   if (os.path.normcase(x['name']).startswith(prefix) and
+                       x['name'].count('/') == nlevels and
+                       pattern_match(x['name']))]
         if not matches:
             logger.error("Cannot access %s: no matching libraries "
                          "or folders\n" % path)
             return
         # Identify the folders that are matched exactly
-        folders = []
-        for item in matches:
-            if item['type'] == 'folder' and item['name'] != '/':
-                folders.append(item)
+        folders = [x for x in matches
+                   if x['type'] == 'folder' and x['name'] != '/']
+        folder_names = { x['name'] for x in folders }
         # Locate non-folder items that are not in any of
         # the folders previously identified
-        datasets = []
-        for item in matches:
-            implicit_dataset = False
-            if item['type'] == 'folder':
-                continue
-            else:
-                parent = os.path.split(item['name'])[0]
-                for folder in folders:
-                    if folder['name'] == parent:
-                        #print("Parent = %s" % parent)
-                        implicit_dataset = True
-                        break
-            # Item outside of folders
-            if not implicit_dataset:
-                datasets.append(item)
+        datasets = [x for x in matches
+                    if (x['type'] != 'folder' and
+                        (x['name'].rpartition('/')[0] or '/')
+                        not in folder_names)]
+        # Fetch more info for all the folders and datasets
+        # to be reported
+        details = get_library_item_details(
+            gi,library_id,
+            [item for folder in folders
+             for item in contents_by_parent.get(folder['name'],[])] +
+            datasets)
         # List the contents of each folder
         for folder in folders:
-            output = Reporter()
             print("\n%s:" % folder['name'])
-            folder_contents = [x for x in library_contents if
-                               os.path.split(x['name'])[0] == folder['name']]
-            for item in folder_contents:
-                if item['type'] == 'folder':
-                    output.append(report_folder(
-                        lib_client.show_folder(library_id,
-                                               item['id']),
-                        long_listing=long_listing_format,
-                        show_id=show_id))
-                else:
-                    output.append(report_dataset(
-                        item['id'],
-                        dataset_client.show_dataset(item['id'],
-                                                    hda_ldda='ldda'),
-                        long_listing=long_listing_format,
-                        show_id=show_id))
+            folder_contents = contents_by_parent.get(folder['name'],[])
             # Output to stdout
-            output.report()
+            report_library_items(folder_contents,details,
+                                 long_listing=long_listing_format,
+                                 show_id=show_id).report()
             if long_listing_format:
                 print("total %s" % len(folder_contents))
         # List the datasets
         if datasets:
             print("\n.:")
-            output = Reporter()
-            for dataset in datasets:
-                output.append(report_dataset(
-                    item['id'],
-                    dataset_client.show_dataset(item['id'],
-                                                hda_ldda='ldda'),
-                    long_listing=long_listing_format,
-                    show_id=show_id))
-            output.report()
+            report_library_items(datasets,details,
+                                 long_listing=long_listing_format,
+                                 show_id=show_id).report()
             print("total %s" % len(datasets))
 
 def create_library(gi,name,description=None,synopsis=None):
@@ -247,10 +276,11 @@ def create_library(gi,name,description=None,synopsis=None):
       str: id for data library.
 
     """
-    lib_client = galaxy.libraries.LibraryClient(gi)
-    if library_id_from_name(gi,name):
+    lib_client = gi.libraries
+    library_id = library_id_from_name(gi,name)
+    if library_id:
         print("Target data library already exists")
-        return library_id_from_name(gi,name)
+        return library_id
     library = lib_client.create_library(name,
                                         description=description,
                                         synopsis=synopsis)
@@ -277,7 +307,7 @@ def create_folder(gi,path,description=None):
     logger.debug("library_name: %s" % library_name)
     logger.debug("folder_path : %s" % folder_path)
     # Get name and id for parent data library
-    lib_client = galaxy.libraries.LibraryClient(gi)
+    lib_client = gi.libraries
     library_id = library_id_from_name(gi,library_name)
     if library_id is None:
         print("Top level data library '%s' not found" % library_name)
@@ -287,7 +317,7 @@ def create_folder(gi,path,description=None):
     # Check folder with same name doesn't already exist
     folder_id = folder_id_from_name(gi,library_id,folder_path)
     #print("folder_id '%s' for '%s'" % (folder_id,folder_path))
-    if folder_id_from_name(gi,library_id,folder_path):
+    if folder_id:
         print("Target folder already exists")
         return None
     #print("folder_name '%s' folder_base '%s'" % (folder_name,
@@ -298,13 +328,16 @@ def create_folder(gi,path,description=None):
                                           description=description,
                                           base_folder_id=base_folder_id)
     #print("%s" % new_folder)
+    # Add the new folder to the index
+    get_folder_index(gi,library_id)[folder_path] = new_folder[0]['id']
     return new_folder[0]['id']
 
 def add_library_datasets(gi,path,files,
                          from_server=False,
                          link_only=False,
                          file_type='auto',
-                         dbkey='?'):
+                         dbkey='?',
+                         max_workers=UPLOAD_JOBS):
     """
     Add datasets to a data library
 
@@ -327,18 +360,24 @@ def add_library_datasets(gi,path,files,
         to all uploaded files (default is 'auto')
       dbkey (str): explicit dbkey to apply to all uploaded
         files (default is '?')
+      max_workers (int): maximum number of files on the local
+        file system to upload concurrently (default is to
+        upload one at a time)
+
+    Returns:
+      0 on success, 1 on failure.
 
     """
     # Check that we're not using a 'userless' API key (e.g.
     # master key)
     if get_current_user(gi) is None:
-        logger.error("No user associated with this API key, "
-                     "data upload aborted")
-        return
+        logger.error("Unable to get user associated with this "
+                     "API key, data upload aborted")
+        return 1
     # Break up the path
     library_name,folder_path = split_library_path(path)
     # Get name and id for parent data library
-    lib_client = galaxy.libraries.LibraryClient(gi)
+    lib_client = gi.libraries
     library_id = library_id_from_name(gi,library_name)
     print(f"Library name '{library_name}' id '{library_id}'")
     # Get id for parent folder
@@ -349,22 +388,35 @@ def add_library_datasets(gi,path,files,
         filesystem_paths = '\n'.join(files)
         print("Uploading files from Galaxy server:")
         print("%s" % filesystem_paths)
-        lib_client.upload_from_galaxy_filesystem(
-            library_id,filesystem_paths,
-            folder_id=folder_id,
-            file_type=file_type,
-            dbkey=dbkey,
-            link_data_only=link_only,
-            roles='')
-    else:
-        # Files are on localhost
-        for f in files:
-            print("Uploading file '%s'" % f)
-            lib_client.upload_file_from_local_path(
-                library_id,f,
+        try:
+            lib_client.upload_from_galaxy_filesystem(
+                library_id,filesystem_paths,
                 folder_id=folder_id,
                 file_type=file_type,
-                dbkey=dbkey)
+                dbkey=dbkey,
+                link_data_only=link_only,
+                roles='')
+        except ConnectionError as ex:
+            logger.error("Failed to upload files from Galaxy "
+                         "server: %s",ex)
+            return 1
+        return 0
+    else:
+        # Files are on localhost: upload (possibly concurrently)
+        def upload_file(f):
+            print("Uploading file '%s'" % f)
+            try:
+                lib_client.upload_file_from_local_path(
+                    library_id,f,
+                    folder_id=folder_id,
+                    file_type=file_type,
+                    dbkey=dbkey)
+            except (ConnectionError,OSError) as ex:
+                logger.error("Failed to upload file '%s': %s",f,ex)
+                return 1
+            return 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return max(executor.map(upload_file,files),default=0)
 
 def split_library_path(path):
     """
@@ -390,6 +442,7 @@ def split_library_path(path):
     return (library_name,
             normalise_folder_path(folder_name))
 
+@lru_cache(maxsize=1024)
 def normalise_folder_path(path):
     """
     Normalise a folder path
@@ -401,6 +454,9 @@ def normalise_folder_path(path):
 
     i.e a single leading slash with no trailing slash
 
+    Results are cached, as the same paths are typically
+    normalised many times.
+
     Arguments:
       path (str): path for a data library folder
 
@@ -408,7 +464,39 @@ def normalise_folder_path(path):
       str: normalised folder path.
 
     """
-    return  '/'+'/'.join([x for x in path.split('/') if x != ''])
+    return '/'+'/'.join([x for x in path.split('/') if x])
+
+def report_library_items(items,details,long_listing=False,show_id=False):
+    """
+    Report details of folders and datasets in a library
+
+    Arguments:
+      items (list): list of dictionaries for library
+        folders and datasets, as returned when getting the
+        contents of the library
+      details (dict): mapping of item IDs to the details
+        for each item (see 'get_library_item_details')
+      long_listing (boolean): if True then use a
+        long listing format when reporting items
+      show_id (boolean): if True then include the IDs
+
+    Returns:
+      Reporter: Reporter populated with a line for each
+        item.
+
+    """
+    output = Reporter()
+    for item in items:
+        if item['type'] == 'folder':
+            output.append(report_folder(details[item['id']],
+                                        long_listing=long_listing,
+                                        show_id=show_id))
+        else:
+            output.append(report_dataset(item['id'],
+                                         details[item['id']],
+                                         long_listing=long_listing,
+                                         show_id=show_id))
+    return output
 
 def report_folder(folder_data,long_listing=False,show_id=False):
     """
@@ -27,3 +27,36 @@ def install_resolver_dependencies_option(default='yes'):
                         "resolver that supports installation "
                         "(e.g. conda) (default is '%s')" %
                         default)
+
+def timeout_option(default=600):
+    return click.option('--timeout',metavar='TIMEOUT',
+                        default=default,
+                        help="wait up to TIMEOUT seconds for tool "
+                        "installations to complete (default is %s)."
+                        % default)
+
+def no_wait_option():
+    return click.option('--no-wait',is_flag=True,
+                        help="don't wait for lengthy tool "
+                        "installations to complete.")
+
+def no_confirm_option(operation):
+    return click.option('-y','--yes',is_flag=True,
+                        help="don't ask for confirmation of %s." %
+                        operation)
+
+def only_check_option(account='new account'):
+    return click.option('--check','-c','only_check',is_flag=True,
+                        help="check user details but don't try to "
+                        "create the %s." % account)
+
+def message_template_option():
+    return click.option('--message','-m','message_template',
+                        type=click.Path(exists=True),
+                        help="Mako template to populate and output.")
+
+def jobs_option(items,default=1):
+    return click.option('-j','--jobs',type=click.IntRange(min=1),
+                        default=default,
+                        help="number of %s to process concurrently "
+                        "(default is %d)." % (items,default))
@@ -2,10 +2,13 @@
 #
 # quotas: functions for managing quotas
 import logging
-import fnmatch
+from concurrent.futures import ThreadPoolExecutor
 from bioblend import galaxy
 from bioblend import ConnectionError
 from .core import Reporter
+from .core import FETCH_JOBS
+from .core import instance_store
+from .core import compile_glob
 from .core import prompt_for_confirmation
 from .users import User
 from .users import get_users
@@ -22,7 +25,7 @@ VALID_DEFAULTS = ('registered',
 
 # Classes
 
-class Quota(object):
+class Quota:
     """
     Class wrapping extraction of quota data
 
@@ -30,7 +33,28 @@ class Quota(object):
     in a Galaxy instance, which has been retrieved via a
     a call to the Galaxy API using bioblend.
 
+    Only the data items returned by Galaxy for a quota
+    (i.e. those listed in '_FIELDS') are stored.
+
     """
+    # Data items returned by Galaxy for a quota, plus
+    # the associated users and groups (built on demand)
+    __slots__ = ('id',
+                 'name',
+                 'bytes',
+                 'default',
+                 'description',
+                 'display_amount',
+                 'groups',
+                 'operation',
+                 'users',
+                 'deleted',
+                 'model_class',
+                 'url',
+                 '_list_users',
+                 '_list_groups',)
+    _FIELDS = frozenset([x for x in __slots__ if not x.startswith('_')])
+
     def __init__(self,quota_data):
         """
         Create a new Quota instance
@@ -56,6 +80,8 @@ class Quota(object):
         self.operation = None
         self.users = None
         self.deleted = None
+        self._list_users = None
+        self._list_groups = None
         # Populate with additional data items
         self.update(quota_data)
 
@@ -70,23 +96,45 @@ class Quota(object):
             return self.default[0]['type']
         return None
 
+    @property
+    def n_users(self):
+        """
+        Returns number of associated users
+        """
+        return len(self.users) if self.users else 0
+
+    @property
+    def n_groups(self):
+        """
+        Returns number of associated groups
+        """
+        return len(self.groups) if self.groups else 0
+
     @property
     def list_users(self):
         """
         Returns list of associated User instances
+
+        The list is only built on the first access (and
+        after the quota data is updated).
         """
-        if self.users:
-            return [User(u['user']) for u in self.users]
-        return []
+        if self._list_users is None:
+            self._list_users = [User(u['user'])
+                                for u in self.users or []]
+        return self._list_users
 
     @property
     def list_groups(self):
         """
         Returns list of associated Group instances
+
+        The list is only built on the first access (and
+        after the quota data is updated).
         """
-        if self.groups:
-            return [Group(g['group']) for g in self.groups]
-        return []
+        if self._list_groups is None:
+            self._list_groups = [Group(g['group'])
+                                 for g in self.groups or []]
+        return self._list_groups
 
     def update(self,quota_data):
         """
@@ -104,12 +152,13 @@ class Quota(object):
                             "with data for quota ID '%s'" %
                             (self.id,
                              quota_data['id']))
-        # Update the attributes
-        for attr in quota_data.keys():
-            try:
-                setattr(self,attr,quota_data[attr])
-            except AttributeError:
-                pass
+        # Update the known attributes
+        for k in self._FIELDS.intersection(quota_data):
+            setattr(self,k,quota_data[k])
+        # Discard associated users and groups built from
+        # the previous data
+        self._list_users = None
+        self._list_groups = None
 
 # Functions
 
@@ -138,17 +187,26 @@ def handle_quota_spec(quota):
         amount = quota
     return (operation,amount)
 
-def get_quotas(gi,status='active'):
+def get_quotas(gi,status='active',details=True,max_workers=FETCH_JOBS):
     """
     Return list of quotas from a Galaxy instance
 
+    By default the full details of each quota are fetched
+    (concurrently); if only the basic quota data (i.e. the
+    IDs and names) are needed then set 'details' to False
+    to avoid the additional requests.
+
     Arguments:
       gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      status (bool): only return quotas with the matching
+        status ('active', 'deleted' or 'all')
+      details (bool): if True (the default) then fetch the
+        full details of each quota
+      max_workers (int): maximum number of requests for
+        quota details to make concurrently (default is 8)
 
     Returns:
       list: list of Quota objects.
-      status (bool): only return quotas with the matching
-        status ('active', 'deleted' or 'all')
 
     """
     quotas = []
@@ -156,19 +214,111 @@ def get_quotas(gi,status='active'):
     # Get active quotas
     if status in ('active','all'):
         for quota_data in quota_client.get_quotas():
-            quota = Quota(quota_data)
-            quota.update(quota_client.show_quota(quota.id))
-            quotas.append(quota)
+            quotas.append(Quota(quota_data))
     # Get deleted quotas
     if status in ('deleted','all'):
         for quota_data in quota_client.get_quotas(deleted=True):
             quota = Quota(quota_data)
-            quota.update(quota_client.show_quota(quota.id,
-                                                 deleted=True))
             quota.deleted = True
             quotas.append(quota)
+    # Fetch the details for each quota
+    if details:
+        fetch_quota_details(gi,quotas,max_workers=max_workers)
     return quotas
 
+def get_quota(gi,name,status='all',details=True):
+    """
+    Return a single named quota from a Galaxy instance
+
+    Only the details for the matching quota are fetched
+    (and only if 'details' is True).
+
+    Arguments:
+      gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      name (str): name of the quota
+      status (bool): only look for quotas with the matching
+        status ('active', 'deleted' or 'all' (the default))
+      details (bool): if True (the default) then fetch the
+        full details of the quota
+
+    Returns:
+      Quota: Quota object for the named quota, or None if
+        there is not exactly one quota with the name.
+
+    """
+    quotas = [q for q in get_quotas(gi,status=status,details=False)
+              if q.name == name]
+    if len(quotas) != 1:
+        return None
+    if details:
+        fetch_quota_details(gi,quotas)
+    return quotas[0]
+
+def fetch_quota_details(gi,quotas,max_workers=FETCH_JOBS):
+    """
+    Fetch the full details for a list of quotas
+
+    The details are fetched concurrently (see
+    'get_quota_data') and used to update each of the
+    Quota objects in place.
+
+    Arguments:
+      gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      quotas (list): list of Quota objects
+      max_workers (int): maximum number of requests for
+        quota details to make concurrently (default is 8)
+
+    """
+    def get_details(quota):
+        return get_quota_data(gi,quota.id,deleted=bool(quota.deleted))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for quota,quota_data in zip(quotas,
+                                    executor.map(get_details,quotas)):
+            deleted = quota.deleted
+            quota.update(quota_data)
+            if deleted:
+                quota.deleted = True
+
+def get_quota_data(gi,quota_id,deleted=False,force=False):
+    """
+    Return the full details for a quota
+
+    The data from the first successful request for each
+    quota is stored on the Galaxy instance and returned
+    by subsequent calls, unless 'force' is set.
+
+    Arguments:
+      gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      quota_id (str): ID of the quota
+      deleted (bool): set True if the quota is deleted
+      force (bool): if True then always request the data
+        from Galaxy, rather than returning stored data
+
+    Returns:
+      Dictionary: the data for the quota.
+
+    """
+    quota_data = instance_store(gi,'quotas')
+    if force or quota_id not in quota_data:
+        quota_data[quota_id] = \
+            galaxy.quotas.QuotaClient(gi).show_quota(quota_id,
+                                                     deleted=deleted)
+    return quota_data[quota_id]
+
+def clear_quota_data(gi,quota_id):
+    """
+    Discard the stored details for a quota
+
+    Should be called after a quota has been modified, so
+    that the details are fetched again when next needed.
+
+    Arguments:
+      gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
+      quota_id (str): ID of the quota
+
+    """
+    instance_store(gi,'quotas').pop(quota_id,None)
+
 def list_quotas(gi,name=None,status='active',long_listing_format=False):
     """
     List quotas in Galaxy instance
@@ -183,26 +333,28 @@ def list_quotas(gi,name=None,status='active',long_listing_format=False):
         long listing format when reporting items
 
     """
-    # Get quota data
+    # Get quota data (filtering on the supplied name before
+    # fetching the details, so they are only fetched for
+    # quotas which will be reported)
     try:
-        quotas = get_quotas(gi,status=status)
+        quotas = get_quotas(gi,status=status,details=False)
+        if name:
+            name_match = compile_glob(name.lower())
+            quotas = [q for q in quotas
+                      if name_match(q.name.lower())]
+        fetch_quota_details(gi,quotas)
     except ConnectionError as ex:
         logger.fatal("Failed to get quota list: %s (%s)" % (ex.body,
                                                             ex.status_code))
         return 1
-    # Filter quota list on supplied name
-    if name:
-        name = name.lower()
-        quotas = [q for q in quotas
-                  if fnmatch.fnmatch(q.name.lower(),name)]
     # Sort into order
     quotas.sort(key=lambda q: q.name.lower())
     # Report quotas
     if not long_listing_format:
         output = Reporter()
         for quota in quotas:
-            n_users = len(quota.list_users)
-            n_groups = len(quota.list_groups)
+            n_users = quota.n_users
+            n_groups = quota.n_groups
             # Collect data items to report on a single line
             display_items = [quota.name,
                              "%s%s" % (quota.operation,
@@ -221,8 +373,8 @@ def list_quotas(gi,name=None,status='active',long_listing_format=False):
         # Long listing format reports each quota in
         # a block
         for quota in quotas:
-            n_users = len(quota.list_users)
-            n_groups = len(quota.list_groups)
+            n_users = quota.n_users
+            n_groups = quota.n_groups
             print("Quota name : %s" % quota.name)
             print("Description: %s" % quota.description)
             print("Operation  : %s" % quota.operation)
@@ -265,7 +417,8 @@ def create_quota(gi,name,description,amount,operation,default=None,
         new quota
     """
     # Check for existing quota name
-    existing_quotas = [q for q in get_quotas(gi,status='all')
+    existing_quotas = [q for q in get_quotas(gi,status='all',
+                                             details=False)
                        if q.name == name]
     if existing_quotas:
         logger.fatal("'%s': quota already exists with this name" %
@@ -283,14 +436,14 @@ def create_quota(gi,name,description,amount,operation,default=None,
         default = 'no'
     # Sort out the users and groups
     if users:
-        galaxy_users = [u.email for u in get_users(gi)]
+        galaxy_users = { u.email for u in get_users(gi,details=False) }
         for user in users:
             # Check that user exists
             if user not in galaxy_users:
                 logger.fatal("%s: user doesn't exist" % user)
                 return 1
     if groups:
-        galaxy_groups = [g.name for g in get_groups(gi)]
+        galaxy_groups = { g.name for g in get_groups(gi,details=False) }
         for group in groups:
             # Check that the group exists
             if group not in galaxy_groups:
@@ -357,12 +510,10 @@ def update_quota(gi,name,new_name=None,new_description=None,
       undelete: if True then restores deleted quota
     """
     # Get the current settings for the quota
-    quota = [q for q in get_quotas(gi,status='all')
-             if q.name == name]
-    if len(quota) != 1:
+    quota = get_quota(gi,name,status='all')
+    if quota is None:
         logger.fatal("'%s': no such quota?" % name)
         return 1
-    quota = quota[0]
     # Check if deleted quota is being restored
     if quota.deleted and not undelete:
         logger.fatal("'%s': trying to modify a deleted quota"
@@ -404,38 +555,41 @@ def update_quota(gi,name,new_name=None,new_description=None,
     users = None
     if add_users or remove_users:
         users = [u.email for u in quota.list_users]
-        if add_users:
-            galaxy_users = [u.email for u in get_users(gi)]
-            for user in add_users:
+        # Only add users that aren't already associated
+        # with the quota
+        new_users = [u for u in add_users or [] if u not in users]
+        if new_users:
+            galaxy_users = { u.email for u in get_users(gi,details=False) }
+            for user in new_users:
                 # Check that user exists
                 if user not in galaxy_users:
                     logger.fatal("%s: user doesn't exist" % user)
                     return 1
-                # Only add users that aren't already associated
-                # with the quota
                 if user not in users:
                     users.append(user)
         if remove_users:
-            for user in remove_users:
-                users = [u for u in users if u != user]
+            remove_users = set(remove_users)
+            users = [u for u in users if u not in remove_users]
     # Update list of groups
     groups = None
     if add_groups or remove_groups:
         groups = [g.name for g in quota.list_groups]
-        if add_groups:
-            galaxy_groups = [g.name for g in get_groups(gi)]
-            for group in add_groups:
+        # Only add groups that aren't already associated
+        # with the quota
+        new_groups = [g for g in add_groups or [] if g not in groups]
+        if new_groups:
+            galaxy_groups = { g.name
+                              for g in get_groups(gi,details=False) }
+            for group in new_groups:
                 # Check that group exists
                 if group not in galaxy_groups:
                     logger.fatal("%s: group doesn't exist" % group)
                     return 1
-                # Only add groups that aren't already associated
-                # with the quota
                 if group not in groups:
                     groups.append(group)
         if remove_groups:
-            for group in remove_groups:
-                groups = [g for g in groups if g != group]
+            remove_groups = set(remove_groups)
+            groups = [g for g in groups if g not in remove_groups]
     try:
         quota_client = galaxy.quotas.QuotaClient(gi)
         if quota.deleted and undelete:
@@ -452,6 +606,7 @@ def update_quota(gi,name,new_name=None,new_description=None,
                                            default=default,
                                            in_users=users,
                                            in_groups=groups)
+        clear_quota_data(gi,quota.id)
         if result:
             print("%s" % result)
         return 0
@@ -471,11 +626,10 @@ def delete_quota(gi,name,no_confirm=False):
         deletion operation
     """
     # Get the id for the quota
-    quota = [q for q in get_quotas(gi) if q.name == name]
-    if len(quota) != 1:
+    quota = get_quota(gi,name,status='active',details=False)
+    if quota is None:
         logger.fatal("'%s': no such quota?" % name)
         return 1
-    quota = quota[0]
     # Prompt user for confirmation
     if no_confirm or \
        prompt_for_confirmation("Delete quota '%s'?" % quota.name,
@@ -484,6 +638,7 @@ def delete_quota(gi,name,no_confirm=False):
         try:
             quota_client = galaxy.quotas.QuotaClient(gi)
             result = quota_client.delete_quota(quota.id)
+            clear_quota_data(gi,quota.id)
             print("%s" % result)
             return 0
         except galaxy.client.ConnectionError as ex:
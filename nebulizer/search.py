@@ -4,9 +4,9 @@
 import logging
 import string
 import os
-from fnmatch import fnmatch
 from .core import get_galaxy_instance
 from .core import Reporter
+from .core import compile_glob
 from .tools import normalise_toolshed_url
 from .tools import get_repositories
 from bioblend import toolshed
@@ -50,8 +50,10 @@ def search_toolshed(tool_shed,query_string,gi=None,
                        % connection_error)
         return connection_error.status_code
     # Filter on name
+    query_match = compile_glob(query_string)
     hits = [r for r in search_result['hits'] if
-            fnmatch(r["repository"]["name"].lower(),query_string)]
+            query_match and
+            query_match(r["repository"]["name"].lower())]
     # Deal with the results
     nhits = len(hits)
     if nhits == 0:
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 #
 # tools: functions for managing tools
-import fnmatch
 import time
 import json
 import logging
@@ -10,6 +9,7 @@ from bioblend import toolshed
 from bioblend.galaxy.client import ConnectionError
 from bioblend import ConnectionError as BioblendConnectionError
 from .core import prompt_for_confirmation
+from .core import compile_glob
 from .core import Reporter
 
 # Logging
@@ -401,9 +401,7 @@ class Repository:
         e.g. toolshed.g2.bx.psu.edu/devteam/tophat
 
         """
-        return '/'.join((self.tool_shed,
-                         self.owner,
-                         self.name))
+        return repository_id(self.tool_shed,self.owner,self.name)
 
 class ToolPanelSection:
     """
@@ -565,6 +563,23 @@ def get_tools(gi):
         tools.append(Tool(tool_data))
     return tools
 
+def repository_id(tool_shed,owner,name):
+    """
+    Return the 'id' for a repository
+
+    The id string is TOOL_SHED/OWNER/TOOL
+
+    Arguments:
+      tool_shed (str): tool shed for the repository
+      owner (str): repository owner
+      name (str): repository name
+
+    Returns:
+      String: the repository id.
+
+    """
+    return '/'.join((tool_shed,owner,name))
+
 def get_repositories(gi):
     """
     Return list of repositories installed in a Galaxy instance
@@ -576,22 +591,19 @@ def get_repositories(gi):
       list: list of Repository objects.
 
     """
-    repos = []
+    repos = {}
     shed_client = galaxy.toolshed.ToolShedClient(gi)
     for repo_data in shed_client.get_repositories():
-        repo = Repository(repo_data)
-        existing_repos = [x for x in repos if x.id == repo.id]
-        if not existing_repos:
+        repo_id = repository_id(repo_data['tool_shed'],
+                                repo_data['owner'],
+                                repo_data['name'])
+        if repo_id not in repos:
             # No entry for this repository
-            repos.append(repo)
-        elif len(existing_repos) == 1:
-            # Single match, add this as a revision
-            existing_repos[0].add_revision(repo_data)
+            repos[repo_id] = Repository(repo_data)
         else:
-            # Multiple matches - error
-            raise Exception("Multiple instances for %s?" %
-                            repo.id)
-    return repos
+            # Existing entry, add this as a revision
+            repos[repo_id].add_revision(repo_data)
+    return list(repos.values())
 
 def get_tool_panel_sections(gi):
     """
@@ -808,8 +820,8 @@ def builtin_tools(gi,name=None,as_repos=False):
     tools = [t for t in get_tools(gi) if t.tool_repo == '']
     # Filter on name
     if name:
-        name = name.lower()
-        tools = [t for t in tools if fnmatch.fnmatch(t.name.lower(),name)]
+        name_match = compile_glob(name.lower())
+        tools = [t for t in tools if name_match(t.name.lower())]
     # Return results
     if not as_repos:
         # Return list as-is
@@ -889,20 +901,30 @@ def installed_repositories(gi,name=None,
     repos = get_repositories(gi)
     # Filter on name
     if name:
-        name = name.lower()
-        repos = [r for r in repos if fnmatch.fnmatch(r.name.lower(),name)]
+        name_match = compile_glob(name.lower())
+        repos = [r for r in repos if name_match(r.name.lower())]
     # Filter on toolshed
     if tool_shed:
         # Strip leading http(s)://
         for protocol in ('https://','http://'):
             if tool_shed.startswith(protocol):
                 tool_shed = tool_shed[len(protocol):]
-        repos = [r for r in repos if fnmatch.fnmatch(r.tool_shed,tool_shed)]
+        tool_shed_match = compile_glob(tool_shed)
+        if tool_shed_match is None:
+            # Nothing left after stripping the protocol so
+            # no repositories can match
+            repos = []
+        else:
+            repos = [r for r in repos if tool_shed_match(r.tool_shed)]
     # Filter on owner
     if owner:
-        repos = [r for r in repos if fnmatch.fnmatch(r.owner,owner)]
-    # Get list of tools
-    tools = get_tools(gi)
+        owner_match = compile_glob(owner)
+        repos = [r for r in repos if owner_match(r.owner)]
+    # Get list of tools, indexed by repository and changeset
+    tools = {}
+    for tool in get_tools(gi):
+        key = (tool.tool_repo,tool.tool_changeset)
+        tools.setdefault(key,[]).append(tool)
     for repo in repos:
         # Also check against tool shed?
         if check_tool_shed:
@@ -919,10 +941,9 @@ def installed_repositories(gi,name=None,
                  not revision.tool_shed_has_newer_revision())):
                 continue
             # Fetch tools associated with this revision
-            repo_tools = [t for t in tools
-                          if (t.tool_repo == repo.id and
-                              t.tool_changeset ==
-                              revision.installed_changeset_revision)]
+            repo_tools = tools.get((repo.id,
+                                    revision.installed_changeset_revision),
+                                   [])
             # Append to the list
             installed_repos.append((repo,revision,repo_tools))
     # Finished
@@ -1093,10 +1114,10 @@ def list_tool_panel(gi,name=None,list_tools=False):
     tool_panel = ToolPanel(gi)
     # Filter on name
     if name:
-        name = name.lower()
+        name_match = compile_glob(name.lower())
         sections = [s for s in tool_panel.sections
                     if s.name is not None and
-                    fnmatch.fnmatch(s.name.lower(),name)]
+                    name_match(s.name.lower())]
     else:
         sections = tool_panel.sections
     # Get list of tools, if required
@@ -1253,11 +1274,15 @@ def update_tool(gi,tool_shed,name,owner,
     """
     # Locate the existing installation
     repos = []
-    for repo in get_repositories(gi):
-        if repo.tool_shed == tool_shed and \
-           fnmatch.fnmatch(repo.owner,owner) and \
-           fnmatch.fnmatch(repo.name,name):
-            repos.append(repo)
+    owner_match = compile_glob(owner)
+    name_match = compile_glob(name)
+    if owner_match and name_match:
+        # (an empty owner or name doesn't match any repository)
+        for repo in get_repositories(gi):
+            if repo.tool_shed == tool_shed and \
+               owner_match(repo.owner) and \
+               name_match(repo.name):
+                repos.append(repo)
     if not repos:
         logger.critical("%s/%s: unable to find repositories to update" %
                         (owner,name))
@@ -4,11 +4,11 @@
 import logging
 import re
 import getpass
-import fnmatch
+from concurrent.futures import ThreadPoolExecutor
 from bioblend import galaxy
 from bioblend import ConnectionError
-from mako.template import Template
 from .core import get_galaxy_config
+from .core import compile_glob
 from .core import prompt_for_confirmation
 from .core import Reporter
 
@@ -190,14 +190,23 @@ class User:
 
 # Functions
 
-def get_users(gi,status='active'):
+def get_users(gi,status='active',details=True):
     """
     Return list of users in a Galaxy instance
 
+    By default the full details of each user are fetched;
+    if only the basic user data (i.e. the IDs, emails and
+    usernames) are needed for active users then set
+    'details' to False to avoid the additional requests.
+    (The details are always fetched for deleted users, as
+    they are needed to determine if a user is purged.)
+
     Arguments:
       gi (bioblend.galaxy.GalaxyInstance): Galaxy instance
       status (bool): only return users with the matching
         status ('active', 'deleted', 'purged' or 'all')
+      details (bool): if True (the default) then fetch the
+        full details of each active user
 
     Returns:
       list: list of User objects.
@@ -209,7 +218,8 @@ def get_users(gi,status='active'):
     if status in ('active','all'):
         for user_data in user_client.get_users():
             user = User(user_data)
-            user.update(galaxy.users.UserClient(gi).show_user(user.id))
+            if details:
+                user.update(user_client.show_user(user.id))
             users.append(user)
     # Get deleted and purged users
     if status in ('deleted','purged','all'):
@@ -236,9 +246,13 @@ def get_user(gi,email):
     Returns:
       User: 'User' instance, or None if no match.
     """
+    email_match = compile_glob(email)
+    if email_match is None:
+        # No email so no matching user
+        return None
     try:
         for u in get_users(gi,status='all'):
-            if fnmatch.fnmatch(u.email,email):
+            if email_match(u.email):
                 return u
     except ConnectionError as ex:
         logger.warning("Failed to get user list: {} ({})".format(ex.body,
@@ -295,10 +309,10 @@ def list_users(gi,name=None,long_listing_format=False,status='active',
         enable_quotas = False
     # Filter user list on supplied name
     if name:
-        name = name.lower()
+        name_match = compile_glob(name.lower())
         users = [u for u in users if
-                 (fnmatch.fnmatch(u.username.lower(),name) or
-                  fnmatch.fnmatch(u.email.lower(),name))]
+                 (name_match(u.username.lower()) or
+                  name_match(u.email.lower()))]
     # Sort into order
     if not sort_by:
         sort_by = ()
@@ -333,7 +347,7 @@ def list_users(gi,name=None,long_listing_format=False,status='active',
     print("total %s" % len(users))
 
 def create_user(gi,email,username=None,passwd=None,only_check=False,
-                mako_template=None):
+                mako_template=None,users=None):
     """
     Create a new Galaxy user
 
@@ -350,14 +364,17 @@ def create_user(gi,email,username=None,passwd=None,only_check=False,
       only_check: if True then only run the checks, don't try to
         make the user on the system.
       mako_template (optional): Mako template that will be populated
-        and printed
+        and printed (either a compiled Template or a file name)
+      users: (optional) list of User objects to check the new
+        user against; if not supplied then the users will be
+        fetched from the Galaxy instance
 
     Returns:
       0 on success, 1 on failure.
 
     """
     # Check if user already exists
-    if not check_new_user_info(gi,email,username):
+    if not check_new_user_info(gi,email,username,users=users):
         return 1
     if only_check:
         print("Email and username ok: not currently in use")
@@ -383,7 +400,7 @@ def create_user(gi,email,username=None,passwd=None,only_check=False,
     return 0
 
 def create_users_from_template(gi,template,start,end,passwd=None,
-                               only_check=False):
+                               only_check=False,max_workers=1):
     """
     Create a batch of users in Galaxy, based on template email
 
@@ -415,6 +432,10 @@ def create_users_from_template(gi,template,start,end,passwd=None,
         the user will be prompted to supply a password.
       only_check: if True then only run the checks, don't try to
         make the users on the system.
+      max_workers: (optional) maximum number of accounts to create
+        concurrently (default is to create one at a time, stopping
+        at the first failure; otherwise all the accounts are
+        attempted even if some fail).
 
     Returns:
       0 on success, 1 on failure.
@@ -438,26 +459,26 @@ def create_users_from_template(gi,template,start,end,passwd=None,
             return 1
     # Generate emails
     emails = [template.replace('#',str(i)) for i in range(start,end+1)]
-    # Check that these are available
+    # Check that these are available against a single
+    # listing of the existing users
     print("Checking availability")
+    existing_users = get_users(gi,details=False)
     for email in emails:
         name = get_username_from_login(email)
         ##print("%s, %s" % (email,name))
-        if not check_new_user_info(gi,email,name):
+        if not check_new_user_info(gi,email,name,users=existing_users):
             return 1
     if only_check:
         print("All emails and usernames ok: not currently in use")
         return 0
     # Make the accounts
-    for email in emails:
-        name = get_username_from_login(email)
-        print("Email : %s" % email)
-        print("Name  : %s" % name)
-        if create_user(gi,email,name,passwd):
-            return 1
-    return 0
+    accounts = [(email,get_username_from_login(email),passwd)
+                for email in emails]
+    return _create_users(gi,accounts,users=existing_users,
+                         max_workers=max_workers)
 
-def create_batch_of_users(gi,tsv,only_check=False,mako_template=None):
+def create_batch_of_users(gi,tsv,only_check=False,mako_template=None,
+                          max_workers=1):
     """
     Create a batch of users in Galaxy from a list in a TSV file
 
@@ -483,55 +504,62 @@ def create_batch_of_users(gi,tsv,only_check=False,mako_template=None):
       only_check: if True then only run the checks, don't try to
         make the users on the system.
       mako_template (optional): Mako template that will be populated
-        and printed
+        and printed (either a compiled Template or a file name)
+      max_workers: (optional) maximum number of accounts to create
+        concurrently (default is to create one at a time, stopping
+        at the first failure; otherwise all the accounts are
+        attempted even if some fail).
 
     Returns:
       0 on success, 1 on failure.
     
     """
-    # Open file
+    # Compile the template once for all users
+    if mako_template:
+        mako_template = load_mako_template(mako_template)
+    # Fetch the existing users once for checking against
+    existing_users = get_users(gi,details=False)
+    # Read the file in a single pass
     print("Reading data from file '%s'" % tsv)
     users = {}
-    for line in open(tsv):
-        # Skip blank or comment lines
-        if line.startswith('#') or not line.strip():
-            continue
-        # Extract data
-        items = line.strip().split('\t')
-        passwd = None
-        name = None
-        try:
-            email = items[0].lower().strip()
-            passwd = items[1].strip()
-            name = items[2].strip()
-        except IndexError:
-            pass
-        # Do checks
-        if email in users:
-            logger.error("%s: appears multiple times" % email)
-            return 1
-        if passwd is None:
-            logger.error("%s: no password supplied" % email)
-            return 1
-        elif not validate_password(passwd):
-            logger.error("%s: invalid password\n" % email)
-            return 1
-        if name is None:
-            name = get_username_from_login(email)
-        if check_new_user_info(gi,email,name):
-            users[email] = { 'name': name, 'passwd': passwd }
-            print("{}\t{}\t{}".format(email,'*****',name))
+    with open(tsv,'r') as fp:
+        for line in fp:
+            # Skip blank or comment lines
+            if line.startswith('#') or not line.strip():
+                continue
+            # Extract data
+            items = line.strip().split('\t')
+            passwd = None
+            name = None
+            try:
+                email = items[0].lower().strip()
+                passwd = items[1].strip()
+                name = items[2].strip()
+            except IndexError:
+                pass
+            # Do checks
+            if email in users:
+                logger.error("%s: appears multiple times" % email)
+                return 1
+            if passwd is None:
+                logger.error("%s: no password supplied" % email)
+                return 1
+            elif not validate_password(passwd):
+                logger.error("%s: invalid password\n" % email)
+                return 1
+            if name is None:
+                name = get_username_from_login(email)
+            if check_new_user_info(gi,email,name,users=existing_users):
+                users[email] = { 'name': name, 'passwd': passwd }
+                print("{}\t{}\t{}".format(email,'*****',name))
     if only_check:
         return 0
     # Make the accounts
-    for email in users:
-        name = users[email]['name']
-        passwd = users[email]['passwd']
-        if create_user(gi,email,name,passwd):
-            return 1
-        if mako_template:
-            print(render_mako_template(mako_template,email,passwd))
-    return 0
+    accounts = [(email,users[email]['name'],users[email]['passwd'])
+                for email in users]
+    return _create_users(gi,accounts,users=existing_users,
+                         mako_template=mako_template,
+                         max_workers=max_workers)
 
 def delete_user(gi,email,purge=False,no_confirm=False):
     """
@@ -586,12 +614,73 @@ def delete_user(gi,email,purge=False,no_confirm=False):
         print("User '%s' not deleted and/or purged" % email)
         return 0
 
-def check_new_user_info(gi,email,username):
+def _create_users(gi,accounts,users=None,mako_template=None,
+                  max_workers=1):
+    """
+    Internal: create multiple user accounts using 'create_user'
+
+    If 'max_workers' is 1 then the accounts are created one
+    at a time, stopping at the first failure; otherwise they
+    are created concurrently and all the accounts are
+    attempted even if some fail.
+
+    Finishes by reporting the number of accounts that were
+    created and the number that failed.
+
+    Arguments:
+      gi: Galaxy instance
+      accounts: list of (email,name,passwd) tuples for the
+        new accounts
+      users: (optional) list of User objects to check the
+        new accounts against
+      mako_template (optional): Mako template that will be
+        populated and printed for each new account
+      max_workers: (optional) maximum number of accounts to
+        create concurrently
+
+    Returns:
+      0 if all the accounts were created, 1 on failure.
+
+    """
+    def create_account(account):
+        email,name,passwd = account
+        return create_user(gi,email,name,passwd,
+                           mako_template=mako_template,
+                           users=users)
+    if max_workers == 1:
+        results = []
+        for account in accounts:
+            results.append(create_account(account))
+            if results[-1]:
+                break
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(create_account,accounts))
+    nfailed = sum(results)
+    print("Created %d of %d accounts (%d failed)" %
+          (len(results)-nfailed,len(accounts),nfailed))
+    return (1 if nfailed else 0)
+
+def check_new_user_info(gi,email,username,users=None):
     """
     Check if username or login are already in use
 
+    Arguments:
+      gi: Galaxy instance
+      email: email address to check
+      username: public name to check
+      users: (optional) list of User objects to check
+        against; if not supplied then the users will be
+        fetched from the Galaxy instance
+
+    Returns:
+      Boolean: True if neither the email nor the name are
+        in use, False otherwise.
+
     """
-    lookup_user = [u for u in get_users(gi)
+    if users is None:
+        users = get_users(gi,details=False)
+    lookup_user = [u for u in users
                    if u.email == email or u.username == username]
     if lookup_user:
         error_msg = "User details clash with existing user(s):"
@@ -687,18 +776,45 @@ def get_passwd():
         raise Exception("Passwords don't match")
     return passwd
 
-def render_mako_template(filename,email,password=None):
+def load_mako_template(template):
+    """
+    Return a compiled Mako template
+
+    Mako is only imported when a template is actually
+    needed, as it adds noticeably to the start up time
+    of commands which don't use it.
+
+    Arguments:
+      template: either a compiled Template (which is
+        returned unchanged) or the name of a template
+        file to load and compile
+
+    Returns:
+      Template: compiled Mako template.
+
+    """
+    from mako.template import Template
+    if isinstance(template,Template):
+        return template
+    return Template(filename=template)
+
+def render_mako_template(template,email,password=None):
     """Render Mako template
 
-    Render a Mako template from a file. The following variables are
-    supplied to the template:
+    Render a Mako template, supplied either as a compiled Template
+    or as the name of a file to load it from. The following
+    variables are supplied to the template:
 
     first_name
     email
     password
 
+    Pass a compiled Template when rendering for multiple users, to
+    avoid parsing the template file again for each one.
+
     """
+    template = load_mako_template(template)
     first_name = email.split('.')[0].title()
-    return Template(filename=filename).render(first_name=first_name,
-                                              email=email,
-                                              password=password)
+    return template.render(first_name=first_name,
+                           email=email,
+                           password=password)
@@ -17,6 +17,9 @@ install_requires = ['bioblend==0.15.0',
                     'mako',
                     'click==7.1.2',]
 
+# Optional extras
+extras_require = { 'orjson': ['orjson',], }
+
 # Acquire package version for installation
 # (see https://packaging.python.org/guides/single-sourcing-package-version/)
 def read(rel_path):
@@ -52,6 +55,7 @@ setup(
     },
     license = 'AFL',
     install_requires = install_requires,
+    extras_require = extras_require,
     test_suite = 'nose.collector',
     tests_require = ['nose'],
     platforms="Posix; MacOS X; Windows",
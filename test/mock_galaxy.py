@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+#
+# mock_galaxy: stand-ins for bioblend objects used by the tests
+
+class MockGalaxyInstance:
+    """
+    Stand-in for a bioblend GalaxyInstance
+
+    Takes the same connection arguments as GalaxyInstance;
+    any other keyword arguments are set as attributes (e.g.
+    stand-ins for the API clients such as 'groups').
+    """
+    def __init__(self,url='http://127.0.0.1:8080/api',email=None,
+                 password=None,**attrs):
+        self.url = url
+        self.email = email
+        self.password = password
+        self.__dict__.update(attrs)
@@ -4,7 +4,25 @@ import unittest
 import tempfile
 import shutil
 import os
+import io
+import time
+from unittest import mock
+from contextlib import redirect_stdout
 from nebulizer.core import Credentials
+from nebulizer.core import Reporter
+from nebulizer.core import compile_glob
+from nebulizer.core import glob_prefix
+from nebulizer.core import instance_store
+from nebulizer.core import get_galaxy_instance
+import nebulizer.core
+from nebulizer.core import get_credentials
+from nebulizer.core import use_shared_http_session
+from nebulizer.core import get_ping_session
+from nebulizer.core import ping_galaxy_instance
+from nebulizer.core import _parse_json_with_orjson
+from nebulizer.core import HTTP_MAX_RETRIES
+from nebulizer.core import HTTP_RETRY_STATUSES
+from .mock_galaxy import MockGalaxyInstance
 
 class TestCredentials(unittest.TestCase):
     """
@@ -61,6 +79,48 @@ local\thttp://127.0.0.1:8080\tb8c62624237b6444137ab30
                           '137ab30624237b6444b8c62a'))
         self.assertRaises(KeyError,credentials.fetch_key,'nonexistent')
 
+    def test_has_key(self):
+        """
+        Credentials.has_key: checks for aliases and URLs
+        """
+        tmp_key_file = self._make_key_file()
+        credentials = Credentials(key_file=tmp_key_file)
+        self.assertTrue(credentials.has_key('devel'))
+        self.assertTrue(credentials.has_key('http://prod.example.org'))
+        self.assertFalse(credentials.has_key('staging'))
+
+    def test_list_keys_rereads_modified_file(self):
+        """
+        Credentials.list_keys: picks up changes made to key file
+        """
+        tmp_key_file = self._make_key_file()
+        credentials = Credentials(key_file=tmp_key_file)
+        self.assertEqual(credentials.list_keys(),
+                         ['production',
+                          'devel',
+                          'local'])
+        with open(tmp_key_file,'a') as fp:
+            fp.write("new\thttp://new.example.org\t62a137ab3062\n")
+        self.assertEqual(credentials.list_keys(),
+                         ['production',
+                          'devel',
+                          'local',
+                          'new'])
+
+    def test_list_keys_skips_bad_lines(self):
+        """
+        Credentials.list_keys: skips lines without three fields
+        """
+        tmp_key_file = self._make_key_file()
+        with open(tmp_key_file,'a') as fp:
+            fp.write("broken\thttp://broken.example.org\n")
+        credentials = Credentials(key_file=tmp_key_file)
+        self.assertEqual(credentials.list_keys(),
+                         ['production',
+                          'devel',
+                          'local'])
+        self.assertRaises(KeyError,credentials.fetch_key,'broken')
+
     def test_store_key(self):
         """
         Credentials.store_key: appends new key to key file
@@ -123,6 +183,64 @@ local\thttp://127.0.0.1:8080\tb8c62624237b6444137ab30
                          ('http://127.0.0.1:8080',
                           'b8c62624237b6444137ab30'))
 
+    def test_remove_key_keeps_comments_and_permissions(self):
+        """
+        Credentials.remove_key: keeps comments and file permissions
+        """
+        tmp_key_file = self._make_key_file()
+        os.chmod(tmp_key_file,0o600)
+        credentials = Credentials(key_file=tmp_key_file)
+        credentials.remove_key('devel')
+        with open(tmp_key_file) as fp:
+            self.assertEqual(fp.read(),
+                             """# .nebulizer
+production\thttp://prod.example.org\t37b6444b8c62a137ab306242
+local\thttp://127.0.0.1:8080\tb8c62624237b6444137ab30
+""")
+        self.assertEqual(os.stat(tmp_key_file).st_mode & 0o777,0o600)
+        self.assertFalse(os.path.exists(tmp_key_file + '.tmp'))
+
+    def test_remove_key_with_leading_whitespace(self):
+        """
+        Credentials.remove_key: removes entry with leading whitespace
+        """
+        tmp_key_file = self._make_key_file()
+        with open(tmp_key_file,'a') as fp:
+            fp.write("  test\thttp://test.example.org\t4444b8c62a137ab306\n")
+        credentials = Credentials(key_file=tmp_key_file)
+        self.assertTrue('test' in credentials.list_keys())
+        self.assertTrue(credentials.remove_key('test'))
+        self.assertEqual(Credentials(key_file=tmp_key_file).list_keys(),
+                         ['production',
+                          'devel',
+                          'local'])
+
+    def test_remove_key_failed_write_removes_temp_file(self):
+        """
+        Credentials.remove_key: temporary file is removed on failure
+        """
+        tmp_key_file = self._make_key_file()
+        credentials = Credentials(key_file=tmp_key_file)
+        with mock.patch('nebulizer.core.os.replace',
+                        side_effect=OSError("Failed")):
+            self.assertRaises(OSError,credentials.remove_key,'devel')
+        self.assertFalse(os.path.exists(tmp_key_file + '.tmp'))
+        self.assertEqual(Credentials(key_file=tmp_key_file).list_keys(),
+                         ['production',
+                          'devel',
+                          'local'])
+
+    def test_remove_key_creates_private_temp_file(self):
+        """
+        Credentials.remove_key: temporary file is only readable by owner
+        """
+        tmp_key_file = self._make_key_file()
+        credentials = Credentials(key_file=tmp_key_file)
+        with mock.patch('nebulizer.core.os.open',wraps=os.open) as os_open:
+            credentials.remove_key('devel')
+        self.assertEqual(os_open.call_args[0][0],tmp_key_file + '.tmp')
+        self.assertEqual(os_open.call_args[0][2],0o600)
+
     def test_update_key(self):
         """
         Credentials.update_key: updates details in key file
@@ -153,3 +271,380 @@ local\thttp://127.0.0.1:8080\tb8c62624237b6444137ab30
         credentials.update_key('devel',
                                new_url='http://devel.example.org',
                                new_api_key='137ab30624237b6444b8c62a')
+
+    def test_update_key_keeps_position(self):
+        """
+        Credentials.update_key: keeps position of entry in key file
+        """
+        tmp_key_file = self._make_key_file()
+        credentials = Credentials(key_file=tmp_key_file)
+        credentials.update_key('devel',
+                               new_url='http://devel2.example.org')
+        with open(tmp_key_file) as fp:
+            self.assertEqual(fp.read(),
+                             """# .nebulizer
+production\thttp://prod.example.org\t37b6444b8c62a137ab306242
+devel\thttp://devel2.example.org\t137ab30624237b6444b8c62a
+local\thttp://127.0.0.1:8080\tb8c62624237b6444137ab30
+""")
+        self.assertEqual(Credentials(key_file=tmp_key_file).list_keys(),
+                         ['production',
+                          'devel',
+                          'local'])
+
+class TestReporter(unittest.TestCase):
+    """
+    Tests for the 'Reporter' class
+
+    """
+    def _report(self,reporter,**kws):
+        # Capture and return the report output
+        output = io.StringIO()
+        with redirect_stdout(output):
+            reporter.report(**kws)
+        return output.getvalue()
+
+    def test_report_padded_columns(self):
+        """
+        Reporter: pads columns to line up data
+        """
+        output = Reporter()
+        output.append(['Some data',1.0,3])
+        output.append(['More stuff',21.9,19])
+        self.assertEqual(output.nlines,2)
+        self.assertEqual(self._report(output),
+                         "Some data   1.0   3\n"
+                         "More stuff  21.9  19\n")
+
+    def test_report_no_padding(self):
+        """
+        Reporter: reports with delimiter and no padding
+        """
+        output = Reporter()
+        output.append(['Some data',1.0,3])
+        output.append(['More stuff',21.9,19])
+        self.assertEqual(self._report(output,delimiter='\t',
+                                      padding=False),
+                         "Some data\t1.0\t3\n"
+                         "More stuff\t21.9\t19\n")
+
+    def test_report_prefix_and_ragged_lines(self):
+        """
+        Reporter: handles prefix and lines of different lengths
+        """
+        output = Reporter()
+        output.append(['a',1])
+        output.append(['bbb',22,'extra'])
+        self.assertEqual(self._report(output,prefix='- '),
+                         "- a    1\n"
+                         "- bbb  22  extra\n")
+
+    def test_report_no_lines(self):
+        """
+        Reporter: reports nothing when there are no lines
+        """
+        self.assertEqual(self._report(Reporter()),"")
+
+class TestGetCredentials(unittest.TestCase):
+    """
+    Tests for the 'get_credentials' function
+
+    """
+    def test_get_credentials_is_shared(self):
+        """
+        get_credentials: returns the same shared instance
+        """
+        credentials = get_credentials()
+        self.assertTrue(isinstance(credentials,Credentials))
+        self.assertTrue(get_credentials() is credentials)
+
+class TestCompileGlob(unittest.TestCase):
+    """
+    Tests for the 'compile_glob' function
+
+    """
+    def test_compile_glob_no_pattern(self):
+        """
+        compile_glob: returns None for empty pattern
+        """
+        self.assertEqual(compile_glob(None),None)
+        self.assertEqual(compile_glob(''),None)
+
+    def test_compile_glob_exact_match(self):
+        """
+        compile_glob: matches pattern without wildcards
+        """
+        match = compile_glob('fastqc')
+        self.assertTrue(match('fastqc'))
+        self.assertFalse(match('fastqc_wrapper'))
+        self.assertFalse(match('Fastqc'))
+
+    def test_compile_glob_wildcards(self):
+        """
+        compile_glob: matches pattern with wildcards
+        """
+        match = compile_glob('fast*')
+        self.assertTrue(match('fastqc'))
+        self.assertTrue(match('fastq_groomer'))
+        self.assertFalse(match('trimmomatic'))
+        match = compile_glob('user?@example.org')
+        self.assertTrue(match('user1@example.org'))
+        self.assertFalse(match('user10@example.org'))
+
+    def test_compile_glob_windows_is_case_insensitive(self):
+        """
+        compile_glob: matching ignores case on Windows
+        """
+        import ntpath
+        try:
+            with mock.patch('nebulizer.core.os.path',ntpath):
+                match = compile_glob('FastQC_w*')
+                self.assertTrue(match('fastqc_wrapper'))
+                self.assertFalse(match('trimmomatic'))
+        finally:
+            compile_glob.cache_clear()
+
+    def test_compile_glob_is_cached(self):
+        """
+        compile_glob: returns cached function for same pattern
+        """
+        self.assertTrue(compile_glob('fast*') is compile_glob('fast*'))
+
+class TestGlobPrefix(unittest.TestCase):
+    """
+    Tests for the 'glob_prefix' function
+
+    """
+    def test_glob_prefix(self):
+        """
+        glob_prefix: returns literal prefix of pattern
+        """
+        self.assertEqual(glob_prefix('/run1/*.fq'),'/run1/')
+        self.assertEqual(glob_prefix('/run?/[ab].fq'),'/run')
+        self.assertEqual(glob_prefix('*.fq'),'')
+
+    def test_glob_prefix_no_wildcards(self):
+        """
+        glob_prefix: returns pattern without wildcards
+        """
+        self.assertEqual(glob_prefix('/run1/a.fq'),'/run1/a.fq')
+        self.assertEqual(glob_prefix(''),'')
+
+class TestInstanceStore(unittest.TestCase):
+    """
+    Tests for the 'instance_store' function
+
+    """
+    def test_instance_store(self):
+        """
+        instance_store: returns same store for each name
+        """
+        gi = MockGalaxyInstance()
+        store = instance_store(gi,'groups')
+        self.assertEqual(store,{})
+        store['33b43b4e7093c91f'] = { 'name': 'Group1' }
+        self.assertTrue(instance_store(gi,'groups') is store)
+        self.assertEqual(instance_store(gi,'quotas'),{})
+        self.assertTrue(instance_store(MockGalaxyInstance(),
+                                       'groups') is not store)
+
+class TestGetGalaxyInstance(unittest.TestCase):
+    """
+    Tests for the 'get_galaxy_instance' function
+
+    """
+    def setUp(self):
+        # Don't read the real credentials file
+        patcher = mock.patch('nebulizer.core.get_credentials',
+                             return_value=Credentials(
+                                 key_file=os.path.join(
+                                     tempfile.gettempdir(),
+                                     'nebulizer.no_such_file')))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_galaxy_instance(self,galaxy_instance_class,password):
+        def get_data(gi):
+            return { 'email': 'a.user@example.org', 'key': gi.key }
+        with mock.patch('nebulizer.core.galaxy.GalaxyInstance',
+                        galaxy_instance_class), \
+             mock.patch('nebulizer.core.get_galaxy_config',get_data), \
+             mock.patch('nebulizer.core.get_current_user',get_data):
+            return get_galaxy_instance('http://127.0.0.1:8080',
+                                       email='a.user@example.org',
+                                       password=password)
+
+    def test_get_galaxy_instance_fetches_key_once(self):
+        """
+        get_galaxy_instance: only fetches API key once for email login
+        """
+        class LazyKeyGalaxyInstance(MockGalaxyInstance):
+            # Fetches the API key lazily on first access
+            # (like bioblend's 'GalaxyClient.key')
+            baseauth_calls = 0
+            _key = None
+            @property
+            def key(self):
+                if self._key is None:
+                    LazyKeyGalaxyInstance.baseauth_calls += 1
+                    time.sleep(0.05)
+                    self._key = '137ab30624237b6444b8c62a'
+                return self._key
+        gi = self._get_galaxy_instance(LazyKeyGalaxyInstance,'Pa55w0rd')
+        self.assertEqual(gi.key,'137ab30624237b6444b8c62a')
+        self.assertEqual(LazyKeyGalaxyInstance.baseauth_calls,1)
+
+    def test_get_galaxy_instance_bad_password(self):
+        """
+        get_galaxy_instance: returns None if API key can't be fetched
+        """
+        class BadLoginGalaxyInstance(MockGalaxyInstance):
+            @property
+            def key(self):
+                # bioblend raises a plain Exception
+                raise Exception("Failed to authenticate user.")
+        self.assertEqual(self._get_galaxy_instance(BadLoginGalaxyInstance,
+                                                   'wr0ng'),None)
+
+class TestUseSharedHttpSession(unittest.TestCase):
+    """
+    Tests for the 'use_shared_http_session' function
+
+    """
+    def setUp(self):
+        # Restore bioblend's own 'requests' afterwards
+        import requests
+        import bioblend.galaxyclient
+        patcher = mock.patch.object(bioblend.galaxyclient,'requests',
+                                    requests)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_use_shared_http_session(self):
+        """
+        use_shared_http_session: installs shared session into bioblend
+        """
+        import requests
+        import bioblend.galaxyclient
+        session = use_shared_http_session()
+        self.assertTrue(isinstance(session,requests.Session))
+        self.assertEqual(use_shared_http_session(),session)
+        self.assertEqual(bioblend.galaxyclient.requests.get,session.get)
+        self.assertEqual(bioblend.galaxyclient.requests.RequestException,
+                         requests.RequestException)
+
+    def test_shared_http_session_retries_throttled_requests(self):
+        """
+        use_shared_http_session: retries throttled GET requests
+        """
+        session = use_shared_http_session()
+        retries = session.get_adapter('https://galaxy.org').max_retries
+        self.assertEqual(retries.total,HTTP_MAX_RETRIES)
+        self.assertEqual(set(retries.status_forcelist),
+                         set(HTTP_RETRY_STATUSES))
+        self.assertFalse(retries.raise_on_status)
+        self.assertFalse(retries.is_retry('POST',503))
+        self.assertTrue(retries.is_retry('GET',503))
+        self.assertFalse(retries.is_retry('GET',500))
+        self.assertFalse(retries.is_retry('PUT',502))
+        self.assertFalse(retries.is_retry('DELETE',502))
+
+    def test_shared_http_session_blocks_cookies(self):
+        """
+        use_shared_http_session: session doesn't store cookies
+        """
+        import requests
+        from email.message import Message
+        session = use_shared_http_session()
+        headers = Message()
+        headers['Set-Cookie'] = 'galaxysession=123ab; Path=/'
+        session.cookies.extract_cookies(
+            requests.cookies.MockResponse(headers),
+            requests.cookies.MockRequest(
+                requests.Request('GET','https://galaxy.org/api/users')))
+        self.assertEqual(len(session.cookies),0)
+
+    @unittest.skipIf(nebulizer.core.orjson is None,"orjson not installed")
+    def test_parse_json_with_orjson(self):
+        """
+        _parse_json_with_orjson: parses JSON using orjson
+        """
+        import requests
+        response = requests.Response()
+        response._content = b'{"id": "33b43b4e7093c91f", "deleted": false}'
+        response = _parse_json_with_orjson(response)
+        self.assertEqual(response.json(),
+                         { 'id': '33b43b4e7093c91f', 'deleted': False })
+        self.assertRaises(ValueError,
+                          _parse_json_with_orjson(
+                              requests.Response()).json)
+
+class TestGetPingSession(unittest.TestCase):
+    """
+    Tests for the 'get_ping_session' function
+
+    """
+    def setUp(self):
+        # Restore bioblend's own 'requests' afterwards
+        import requests
+        import bioblend.galaxyclient
+        patcher = mock.patch.object(bioblend.galaxyclient,'requests',
+                                    requests)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_ping_session(self):
+        """
+        get_ping_session: returns separate shared session
+        """
+        import requests
+        session = get_ping_session()
+        self.assertTrue(isinstance(session,requests.Session))
+        self.assertTrue(get_ping_session() is session)
+        self.assertFalse(session is use_shared_http_session())
+
+    def test_ping_session_does_not_retry(self):
+        """
+        get_ping_session: session doesn't retry requests
+        """
+        session = get_ping_session()
+        retries = session.get_adapter('https://galaxy.org').max_retries
+        self.assertEqual(retries.total,0)
+        self.assertFalse(retries.is_retry('GET',503))
+
+class TestPingGalaxyInstance(unittest.TestCase):
+    """
+    Tests for the 'ping_galaxy_instance' function
+
+    """
+    def setUp(self):
+        self.gi = MockGalaxyInstance(
+            default_params={ 'key': '137ab30624237b6444b8c62a' },
+            json_headers={ 'Content-Type': 'application/json' },
+            verify=True,
+            timeout=1)
+
+    def test_ping_galaxy_instance(self):
+        """
+        ping_galaxy_instance: sends API key and reports success
+        """
+        session = mock.Mock()
+        session.get.return_value.status_code = 200
+        with mock.patch('nebulizer.core.get_ping_session',
+                        return_value=session):
+            retcode,_ = ping_galaxy_instance(self.gi)
+        self.assertEqual(retcode,0)
+        self.assertEqual(session.get.call_args[1]['params'],
+                         { 'key': '137ab30624237b6444b8c62a' })
+
+    def test_ping_galaxy_instance_timeout(self):
+        """
+        ping_galaxy_instance: reports timeout as failed ping
+        """
+        import requests
+        session = mock.Mock()
+        session.get.side_effect = requests.exceptions.ReadTimeout()
+        with mock.patch('nebulizer.core.get_ping_session',
+                        return_value=session):
+            retcode,_ = ping_galaxy_instance(self.gi)
+        self.assertEqual(retcode,None)
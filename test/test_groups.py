@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+import unittest
+from nebulizer.groups import Group
+from nebulizer.groups import get_groups
+from nebulizer.groups import iter_groups
+from nebulizer.groups import get_group_data
+from .mock_galaxy import MockGalaxyInstance
+
+class MockGroupsClient:
+    """
+    Stand-in for the bioblend GroupsClient which records calls
+    """
+    def __init__(self):
+        self.shown = []
+    def get_groups(self):
+        return [{ 'id': '33b43b4e7093c91f', 'name': 'bloggs_group' },
+                { 'id': 'd6fbfd317568bb93', 'name': 'doe_group' },
+                { 'id': 'f2db41e1fa331b3e', 'name': 'smith_group' },]
+    def show_group(self,group_id):
+        self.shown.append(group_id)
+        return { 'id': group_id,
+                 'name': { '33b43b4e7093c91f': 'bloggs_group',
+                           'd6fbfd317568bb93': 'doe_group',
+                           'f2db41e1fa331b3e': 'smith_group' }[group_id],
+                 'users_url': '/api/groups/%s/users' % group_id }
+
+class TestGroup(unittest.TestCase):
+    """
+    Tests for the 'Group' class
+
+    """
+    def test_load_group_data(self):
+        # Data returned from galaxy.groups.GroupsClient(gi).get_groups()
+        group_data = { 'model_class': 'Group',
+                       'id': '33b43b4e7093c91f',
+                       'name': 'bloggs_group',
+                       'url': '/api/groups/33b43b4e7093c91f' }
+        group = Group(group_data)
+        self.assertEqual(group.id,'33b43b4e7093c91f')
+        self.assertEqual(group.name,'bloggs_group')
+        self.assertEqual(group.url,'/api/groups/33b43b4e7093c91f')
+    def test_update_group_data(self):
+        # Data returned from galaxy.groups.GroupsClient(gi).show_group()
+        group = Group({ 'id': '33b43b4e7093c91f',
+                        'name': 'bloggs_group' })
+        group.update({ 'model_class': 'Group',
+                       'id': '33b43b4e7093c91f',
+                       'name': 'bloggs_group',
+                       'url': '/api/groups/33b43b4e7093c91f',
+                       'roles_url': '/api/groups/33b43b4e7093c91f/roles',
+                       'users_url': '/api/groups/33b43b4e7093c91f/users',
+                       'unknown_field': 'ignored' })
+        self.assertEqual(group.roles_url,
+                         '/api/groups/33b43b4e7093c91f/roles')
+        self.assertEqual(group.users_url,
+                         '/api/groups/33b43b4e7093c91f/users')
+        self.assertFalse(hasattr(group,'unknown_field'))
+        self.assertFalse(hasattr(group,'__dict__'))
+    def test_update_group_data_wrong_id(self):
+        group = Group({ 'id': '33b43b4e7093c91f',
+                        'name': 'bloggs_group' })
+        self.assertRaises(Exception,
+                          group.update,
+                          { 'id': 'd6fbfd317568bb93',
+                            'name': 'other_group' })
+
+class TestGetGroups(unittest.TestCase):
+    """
+    Tests for the 'get_groups' and 'iter_groups' functions
+
+    """
+    def test_get_groups_with_details(self):
+        gi = MockGalaxyInstance(groups=MockGroupsClient())
+        groups = get_groups(gi,max_workers=2)
+        self.assertEqual([g.name for g in groups],
+                         ['bloggs_group','doe_group','smith_group'])
+        self.assertEqual(groups[1].users_url,
+                         '/api/groups/d6fbfd317568bb93/users')
+        self.assertEqual(sorted(gi.groups.shown),
+                         ['33b43b4e7093c91f',
+                          'd6fbfd317568bb93',
+                          'f2db41e1fa331b3e'])
+        # Details are stored and not requested again
+        get_groups(gi)
+        self.assertEqual(len(gi.groups.shown),3)
+    def test_get_groups_without_details(self):
+        gi = MockGalaxyInstance(groups=MockGroupsClient())
+        groups = get_groups(gi,details=False)
+        self.assertEqual([g.name for g in groups],
+                         ['bloggs_group','doe_group','smith_group'])
+        self.assertFalse(hasattr(groups[0],'users_url'))
+        self.assertEqual(gi.groups.shown,[])
+    def test_iter_groups(self):
+        gi = MockGalaxyInstance(groups=MockGroupsClient())
+        groups = iter_groups(gi,max_workers=2)
+        self.assertEqual(next(groups).name,'bloggs_group')
+        self.assertEqual([g.name for g in groups],
+                         ['doe_group','smith_group'])
+
+class TestGetGroupData(unittest.TestCase):
+    """
+    Tests for the 'get_group_data' function
+
+    """
+    def test_get_group_data(self):
+        gi = MockGalaxyInstance(groups=MockGroupsClient())
+        group_data = get_group_data(gi,'d6fbfd317568bb93')
+        self.assertEqual(group_data['name'],'doe_group')
+        self.assertTrue(get_group_data(gi,'d6fbfd317568bb93') is group_data)
+        self.assertEqual(gi.groups.shown,['d6fbfd317568bb93'])
+        get_group_data(gi,'d6fbfd317568bb93',force=True)
+        self.assertEqual(gi.groups.shown,['d6fbfd317568bb93',
+                                          'd6fbfd317568bb93'])
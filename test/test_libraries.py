@@ -1,8 +1,65 @@
 #!/usr/bin/env python
 
 import unittest
+import io
+from contextlib import redirect_stdout
 from nebulizer.libraries import split_library_path
 from nebulizer.libraries import normalise_folder_path
+from nebulizer.libraries import library_id_from_name
+from nebulizer.libraries import folder_id_from_name
+from nebulizer.libraries import get_library_item_details
+from nebulizer.libraries import report_library_items
+from nebulizer.libraries import add_library_datasets
+from nebulizer.libraries import ConnectionError
+from .mock_galaxy import MockGalaxyInstance
+
+class MockLibraryClient:
+    """
+    Stand-in for the bioblend LibraryClient which counts calls
+    """
+    def __init__(self):
+        self.ncalls = 0
+        self.uploaded = []
+        self.fail = ()
+    def get_libraries(self,name=None):
+        self.ncalls += 1
+        return [lib for lib in ({ 'id': 'f2db41e1fa331b3e',
+                                  'name': 'TestLibrary' },)
+                if lib['name'] == name]
+    def get_folders(self,library_id):
+        self.ncalls += 1
+        return [{ 'id': 'F2db41e1fa331b3e', 'name': '/' },
+                { 'id': 'Ff2db41e1fa331b3', 'name': '/run1' },]
+    def show_folder(self,library_id,folder_id):
+        return { 'id': folder_id, 'name': 'run1' }
+    def upload_file_from_local_path(self,library_id,file_local_path,
+                                    folder_id=None,file_type='auto',
+                                    dbkey='?'):
+        if file_local_path in self.fail:
+            raise ConnectionError("Upload failed",status_code=500)
+        self.uploaded.append(file_local_path)
+    def upload_from_galaxy_filesystem(self,library_id,filesystem_paths,
+                                      folder_id=None,file_type='auto',
+                                      dbkey='?',link_data_only=None,
+                                      roles=''):
+        for f in filesystem_paths.split('\n'):
+            if f in self.fail:
+                raise ConnectionError("Upload failed",status_code=500)
+        self.uploaded.extend(filesystem_paths.split('\n'))
+
+class MockDatasetClient:
+    """
+    Stand-in for the bioblend DatasetClient
+    """
+    def show_dataset(self,dataset_id,hda_ldda='hda'):
+        return { 'id': dataset_id, 'name': 'a.fq', 'hda_ldda': hda_ldda }
+
+def mock_galaxy_instance():
+    """
+    Return a stand-in GalaxyInstance with library and dataset clients
+    """
+    return MockGalaxyInstance(libraries=MockLibraryClient(),
+                              datasets=MockDatasetClient())
 
 class TestSplitLibraryPathFunction(unittest.TestCase):
     """
@@ -58,4 +115,124 @@ class TestNormaliseFolderPath(unittest.TestCase):
     def test_folder_path_remove_multiple_slashes(self):
         self.assertEqual(normalise_folder_path('/path//to/folder///'),
                          '/path/to/folder')
+    def test_folder_path_is_cached(self):
+        hits = normalise_folder_path.cache_info().hits
+        normalise_folder_path('/path/to/cached/folder/')
+        normalise_folder_path('/path/to/cached/folder/')
+        self.assertEqual(normalise_folder_path.cache_info().hits,hits+1)
+
+
+class TestLibraryIdFromName(unittest.TestCase):
+    """
+    Tests for the 'library_id_from_name' function
 
+    """
+    def test_library_id_from_name(self):
+        gi = mock_galaxy_instance()
+        self.assertEqual(library_id_from_name(gi,'TestLibrary'),
+                         'f2db41e1fa331b3e')
+        self.assertEqual(library_id_from_name(gi,'TestLibrary'),
+                         'f2db41e1fa331b3e')
+        self.assertEqual(gi.libraries.ncalls,1)
+    def test_library_id_from_name_not_found(self):
+        gi = mock_galaxy_instance()
+        self.assertEqual(library_id_from_name(gi,'Missing'),None)
+        self.assertEqual(library_id_from_name(gi,'Missing'),None)
+        self.assertEqual(gi.libraries.ncalls,2)
+
+class TestFolderIdFromName(unittest.TestCase):
+    """
+    Tests for the 'folder_id_from_name' function
+
+    """
+    def test_folder_id_from_name(self):
+        gi = mock_galaxy_instance()
+        self.assertEqual(folder_id_from_name(gi,'f2db41e1fa331b3e','run1'),
+                         'Ff2db41e1fa331b3')
+        self.assertEqual(folder_id_from_name(gi,'f2db41e1fa331b3e','/run1/'),
+                         'Ff2db41e1fa331b3')
+        self.assertEqual(gi.libraries.ncalls,1)
+    def test_folder_id_from_name_not_found(self):
+        gi = mock_galaxy_instance()
+        self.assertEqual(folder_id_from_name(gi,'f2db41e1fa331b3e','run2'),
+                         None)
+        self.assertEqual(folder_id_from_name(gi,'f2db41e1fa331b3e','run2'),
+                         None)
+        self.assertEqual(gi.libraries.ncalls,1)
+
+class TestGetLibraryItemDetails(unittest.TestCase):
+    """
+    Tests for the 'get_library_item_details' function
+
+    """
+    def test_get_library_item_details(self):
+        gi = mock_galaxy_instance()
+        items = [{ 'id': 'Ff2db41e1fa331b3', 'name': '/run1',
+                   'type': 'folder' },
+                 { 'id': '0a1b2c3d4e5f6071', 'name': '/run1/a.fq',
+                   'type': 'file' },]
+        self.assertEqual(get_library_item_details(gi,'f2db41e1fa331b3e',
+                                                  items),
+                         { 'Ff2db41e1fa331b3': { 'id': 'Ff2db41e1fa331b3',
+                                                 'name': 'run1' },
+                           '0a1b2c3d4e5f6071': { 'id': '0a1b2c3d4e5f6071',
+                                                 'name': 'a.fq',
+                                                 'hda_ldda': 'ldda' } })
+
+class TestReportLibraryItems(unittest.TestCase):
+    """
+    Tests for the 'report_library_items' function
+
+    """
+    def test_report_library_items(self):
+        items = [{ 'id': 'Ff2db41e1fa331b3', 'name': '/run1',
+                   'type': 'folder' },
+                 { 'id': '0a1b2c3d4e5f6071', 'name': '/a.fq',
+                   'type': 'file' },]
+        details = { 'Ff2db41e1fa331b3': { 'id': 'Ff2db41e1fa331b3',
+                                          'name': 'run1',
+                                          'description': '',
+                                          'item_count': 1 },
+                    '0a1b2c3d4e5f6071': { 'id': '0a1b2c3d4e5f6071',
+                                          'name': 'a.fq',
+                                          'file_ext': 'fastqsanger' } }
+        output = report_library_items(items,details,show_id=True)
+        self.assertEqual(output.nlines,2)
+        report = io.StringIO()
+        with redirect_stdout(report):
+            output.report(delimiter='\t',padding=False)
+        self.assertEqual(report.getvalue(),
+                         "run1/\tfolder\tFf2db41e1fa331b3\n"
+                         "a.fq\tfastqsanger\tLLDA:0a1b2c3d4e5f6071\n")
+
+class TestAddLibraryDatasets(unittest.TestCase):
+    """
+    Tests for the 'add_library_datasets' function
+
+    """
+    def setUp(self):
+        self.gi = mock_galaxy_instance()
+        self.gi._nebulizer_user = { 'email': 'a.user@example.org' }
+    def _add_library_datasets(self,files,**kws):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status = add_library_datasets(self.gi,'TestLibrary/run1',
+                                          files,**kws)
+        return (status,output.getvalue())
+    def test_add_library_datasets(self):
+        status,output = self._add_library_datasets(['a.fq','b.fq'])
+        self.assertEqual(status,0)
+        self.assertEqual(self.gi.libraries.uploaded,['a.fq','b.fq'])
+        self.assertTrue(output.endswith("Uploading file 'a.fq'\n"
+                                        "Uploading file 'b.fq'\n"))
+    def test_add_library_datasets_with_failure(self):
+        self.gi.libraries.fail = ('a.fq',)
+        status,output = self._add_library_datasets(['a.fq','b.fq'],
+                                                   max_workers=2)
+        self.assertEqual(status,1)
+        self.assertEqual(self.gi.libraries.uploaded,['b.fq'])
+    def test_add_library_datasets_from_server_with_failure(self):
+        self.gi.libraries.fail = ('/data/a.fq',)
+        status,output = self._add_library_datasets(['/data/a.fq'],
+                                                   from_server=True)
+        self.assertEqual(status,1)
@@ -25,6 +25,8 @@ class TestQuota(unittest.TestCase):
         self.assertEqual(quota.default_for,None)
         self.assertEqual(quota.list_users,[])
         self.assertEqual(quota.list_groups,[])
+        self.assertEqual(quota.n_users,0)
+        self.assertEqual(quota.n_groups,0)
     def test_load_quota_data_full(self):
         # Data returned from galaxy.quotas.QuotaClient(gi).show_quota()
         quota_data = { u'users': [],
@@ -92,6 +94,44 @@ class TestQuota(unittest.TestCase):
                          ['galaxy-user',])
         self.assertEqual([g.name for g in quota.list_groups],
                          ['BCF Staff',])
+        self.assertEqual(quota.n_users,1)
+        self.assertEqual(quota.n_groups,1)
+        self.assertTrue(quota.list_users is quota.list_users)
+    def test_update_quota_data(self):
+        quota = Quota({ u'id': u'f2db41e1fa331b3e',
+                        u'name': u'NGS analyst' })
+        quota.update({ u'id': u'f2db41e1fa331b3e',
+                       u'name': u'NGS analyst',
+                       u'operation': u'=',
+                       u'display_amount': u'500.0 GB',
+                       u'default': [{ u'type': u'registered' }],
+                       u'default_for': u'ignored',
+                       u'unknown_field': u'ignored' })
+        self.assertEqual(quota.operation,'=')
+        self.assertEqual(quota.display_amount,'500.0 GB')
+        self.assertEqual(quota.default_for,'registered')
+        self.assertFalse(hasattr(quota,'unknown_field'))
+        self.assertFalse(hasattr(quota,'__dict__'))
+    def test_update_quota_data_resets_users_and_groups(self):
+        quota = Quota({ u'id': u'f2db41e1fa331b3e',
+                        u'name': u'NGS analyst' })
+        self.assertEqual(quota.list_users,[])
+        quota.update({ u'id': u'f2db41e1fa331b3e',
+                       u'users': [{ u'user': { u'id': u'89b5001534959253',
+                                               u'username': u'galaxy-user',
+                                               u'email':
+                                               u'galaxy.user@galaxy.org' }
+                                  }] })
+        self.assertEqual([u.username for u in quota.list_users],
+                         ['galaxy-user',])
+        self.assertEqual(quota.n_users,1)
+    def test_update_quota_data_wrong_id(self):
+        quota = Quota({ u'id': u'f2db41e1fa331b3e',
+                        u'name': u'NGS analyst' })
+        self.assertRaises(Exception,
+                          quota.update,
+                          { u'id': u'a9a3a7ad1f6b4288',
+                            u'name': u'BCF User' })
 
 class TestHandleQuotaSpec(unittest.TestCase):
     """
@@ -1,11 +1,16 @@
 #!/usr/bin/env python
 
 import unittest
+from unittest import mock
 from nebulizer.tools import Tool
 from nebulizer.tools import Repository
 from nebulizer.tools import ToolPanelSection
 from nebulizer.tools import handle_repository_spec
 from nebulizer.tools import normalise_toolshed_url
+from nebulizer.tools import update_tool
+from nebulizer.tools import installed_repositories
+from nebulizer.tools import repository_id
+from nebulizer.tools import TOOL_UPDATE_FAIL
 
 class TestTool(unittest.TestCase):
     """
@@ -424,3 +429,67 @@ class TestNormaliseToolshedUrl(unittest.TestCase):
         self.assertEqual(
             normalise_toolshed_url('127.0.0.1:9009'),
             'https://127.0.0.1:9009')
+
+class TestRepositoryId(unittest.TestCase):
+    """
+    Tests for the 'repository_id' function
+
+    """
+    def test_repository_id(self):
+        self.assertEqual(repository_id('toolshed.g2.bx.psu.edu',
+                                       'devteam','tophat'),
+                         'toolshed.g2.bx.psu.edu/devteam/tophat')
+
+class TestUpdateTool(unittest.TestCase):
+    """
+    Tests for the 'update_tool' function
+
+    """
+    def test_update_tool_empty_owner_or_name(self):
+        self.assertEqual(update_tool(None,'toolshed.g2.bx.psu.edu',
+                                     'fastqc',''),
+                         TOOL_UPDATE_FAIL)
+        self.assertEqual(update_tool(None,'toolshed.g2.bx.psu.edu',
+                                     '','devteam'),
+                         TOOL_UPDATE_FAIL)
+
+class TestInstalledRepositories(unittest.TestCase):
+    """
+    Tests for the 'installed_repositories' function
+
+    """
+    def setUp(self):
+        self.repo = Repository(
+            { 'tool_shed_status':
+              { 'latest_installable_revision': 'True',
+                'revision_update': 'False',
+                'revision_upgrade': 'False',
+                'repository_deprecated': 'False' },
+              'status': 'Installed',
+              'name': 'trimmomatic',
+              'deleted': False,
+              'ctx_rev': '2',
+              'error_message': '',
+              'installed_changeset_revision': 'a60283899c6d',
+              'tool_shed': 'toolshed.g2.bx.psu.edu',
+              'dist_to_shed': False,
+              'id': '68b273cb7d2d6cff',
+              'owner': 'pjbriggs',
+              'uninstalled': False,
+              'changeset_revision': 'a60283899c6d',
+              'includes_datatypes': False })
+    def test_installed_repositories_tool_shed(self):
+        with mock.patch('nebulizer.tools.get_repositories',
+                        return_value=[self.repo]), \
+             mock.patch('nebulizer.tools.get_tools',return_value=[]):
+            repos = installed_repositories(
+                None,tool_shed='https://toolshed.g2.bx.psu.edu')
+        self.assertEqual([r[0].id for r in repos],
+                         ['toolshed.g2.bx.psu.edu/pjbriggs/trimmomatic'])
+    def test_installed_repositories_empty_tool_shed(self):
+        for tool_shed in ('https://','http://'):
+            with mock.patch('nebulizer.tools.get_repositories',
+                            return_value=[self.repo]), \
+                 mock.patch('nebulizer.tools.get_tools',return_value=[]):
+                self.assertEqual(
+                    installed_repositories(None,tool_shed=tool_shed),[])
@@ -1,10 +1,43 @@
 #!/usr/bin/env python
 
 import unittest
+import tempfile
+import shutil
+import os
+import io
+import time
+from unittest import mock
+from contextlib import redirect_stdout
+from mako.template import Template
 from nebulizer.users import User
 from nebulizer.users import check_username_format
 from nebulizer.users import get_username_from_login
 from nebulizer.users import validate_password
+from nebulizer.users import check_new_user_info
+from nebulizer.users import get_user
+from nebulizer.users import render_mako_template
+from nebulizer.users import load_mako_template
+from nebulizer.users import create_batch_of_users
+from nebulizer.users import create_users_from_template
+import nebulizer.users
+
+class MockUserClient:
+    """
+    Stand-in for the bioblend UserClient which records the
+    accounts it is asked to create, failing for any emails
+    listed in 'fail'
+    """
+    created = []
+    fail = ()
+    delay = {}
+    def __init__(self,gi):
+        pass
+    def create_local_user(self,name,email,passwd):
+        time.sleep(MockUserClient.delay.get(email,0))
+        MockUserClient.created.append(email)
+        if email in MockUserClient.fail:
+            raise nebulizer.users.ConnectionError(
+                "Failed to create %s" % email,status_code=400)
 
 class TestUser(unittest.TestCase):
     """
@@ -66,3 +99,158 @@ class TestValidatePassword(unittest.TestCase):
         self.assertFalse(validate_password('abc'))
     def test_valid_password(self):
         self.assertTrue(validate_password('p@55w0rd'))
+
+class TestCheckNewUserInfo(unittest.TestCase):
+    def setUp(self):
+        self.users = [User({ 'username': 'bloggs',
+                             'id': 'd6fbfd317568bb93',
+                             'email': 'joe.bloggs@galaxy.org' })]
+    def test_new_user_info_ok(self):
+        self.assertTrue(check_new_user_info(None,
+                                            'jane.doe@galaxy.org',
+                                            'doe',
+                                            users=self.users))
+    def test_new_user_info_clashes(self):
+        self.assertFalse(check_new_user_info(None,
+                                             'joe.bloggs@galaxy.org',
+                                             'joe',
+                                             users=self.users))
+        self.assertFalse(check_new_user_info(None,
+                                             'jane.doe@galaxy.org',
+                                             'bloggs',
+                                             users=self.users))
+
+class TestGetUser(unittest.TestCase):
+    def test_get_user_empty_email(self):
+        self.assertEqual(get_user(None,''),None)
+
+class TestRenderMakoTemplate(unittest.TestCase):
+    def setUp(self):
+        # Create temp working dir
+        self.tmpdir = tempfile.mkdtemp(suffix='TestRenderMakoTemplate')
+        self.template_file = os.path.join(self.tmpdir,'message.mako')
+        with open(self.template_file,'w') as fp:
+            fp.write("Dear ${first_name}: login ${email} "
+                     "password ${password}")
+    def tearDown(self):
+        # Remove the temporary test directory
+        shutil.rmtree(self.tmpdir)
+    def test_render_mako_template_from_file(self):
+        self.assertEqual(render_mako_template(self.template_file,
+                                              'joe.bloggs@galaxy.org',
+                                              'p@55w0rd'),
+                         "Dear Joe: login joe.bloggs@galaxy.org "
+                         "password p@55w0rd")
+    def test_render_mako_template_from_template(self):
+        template = Template(filename=self.template_file)
+        self.assertEqual(render_mako_template(template,
+                                              'joe.bloggs@galaxy.org',
+                                              'p@55w0rd'),
+                         "Dear Joe: login joe.bloggs@galaxy.org "
+                         "password p@55w0rd")
+    def test_load_mako_template(self):
+        template = load_mako_template(self.template_file)
+        self.assertTrue(isinstance(template,Template))
+        self.assertTrue(load_mako_template(template) is template)
+
+class TestCreateUsersFromTemplate(unittest.TestCase):
+    """
+    Tests for the 'create_users_from_template' function
+
+    """
+    def setUp(self):
+        MockUserClient.created = []
+    def tearDown(self):
+        MockUserClient.fail = ()
+        MockUserClient.delay = {}
+    def _create_users_from_template(self,**kws):
+        output = io.StringIO()
+        with mock.patch('nebulizer.users.get_users',return_value=[]), \
+             mock.patch('nebulizer.users.galaxy.users.UserClient',
+                        MockUserClient), \
+             redirect_stdout(output):
+            status = create_users_from_template(None,'#.user@galaxy.org',
+                                                1,3,passwd='p@ssw0rd',
+                                                **kws)
+        return (status,output.getvalue())
+    def test_create_users_from_template(self):
+        status,output = self._create_users_from_template(max_workers=2)
+        self.assertEqual(status,0)
+        self.assertTrue(output.endswith(
+            "Created 3 of 3 accounts (0 failed)\n"))
+        self.assertEqual(sorted(MockUserClient.created),
+                         ['1.user@galaxy.org',
+                          '2.user@galaxy.org',
+                          '3.user@galaxy.org'])
+    def test_create_users_from_template_stops_at_failure(self):
+        MockUserClient.fail = ('2.user@galaxy.org',)
+        status,output = self._create_users_from_template()
+        self.assertEqual(status,1)
+        self.assertTrue(output.endswith(
+            "Created 1 of 3 accounts (1 failed)\n"))
+        self.assertEqual(MockUserClient.created,
+                         ['1.user@galaxy.org',
+                          '2.user@galaxy.org'])
+    def test_create_users_from_template_concurrent_with_failure(self):
+        MockUserClient.fail = ('1.user@galaxy.org',)
+        # Make the failing account finish last
+        MockUserClient.delay = { '1.user@galaxy.org': 0.1 }
+        status,output = self._create_users_from_template(max_workers=3)
+        self.assertEqual(status,1)
+        self.assertTrue(output.endswith(
+            "Created 2 of 3 accounts (1 failed)\n"))
+        # All accounts are attempted
+        self.assertEqual(sorted(MockUserClient.created),
+                         ['1.user@galaxy.org',
+                          '2.user@galaxy.org',
+                          '3.user@galaxy.org'])
+        self.assertEqual(MockUserClient.created[-1],'1.user@galaxy.org')
+
+class TestCreateBatchOfUsers(unittest.TestCase):
+    def setUp(self):
+        # Create temp working dir
+        self.wd = tempfile.mkdtemp(suffix='TestCreateBatchOfUsers')
+        self.tsv = os.path.join(self.wd,"users.tsv")
+        with open(self.tsv,'w') as fp:
+            fp.write("a.user@galaxy.org\tp@ssw0rd\ta-user\n"
+                     "b.user@galaxy.org\tp@ssw0rd\tb-user\n"
+                     "c.user@galaxy.org\tp@ssw0rd\tc-user\n")
+        MockUserClient.created = []
+    def tearDown(self):
+        # Remove the temp working dir
+        if os.path.exists(self.wd):
+            shutil.rmtree(self.wd)
+        MockUserClient.fail = ()
+    def _create_batch_of_users(self,**kws):
+        output = io.StringIO()
+        with mock.patch('nebulizer.users.get_users',return_value=[]), \
+             mock.patch('nebulizer.users.galaxy.users.UserClient',
+                        MockUserClient), \
+             redirect_stdout(output):
+            status = create_batch_of_users(None,self.tsv,**kws)
+        return (status,output.getvalue())
+    def test_create_batch_of_users(self):
+        MockUserClient.fail = ()
+        status,output = self._create_batch_of_users(max_workers=2)
+        self.assertEqual(status,0)
+        self.assertEqual(sorted(MockUserClient.created),
+                         ['a.user@galaxy.org',
+                          'b.user@galaxy.org',
+                          'c.user@galaxy.org'])
+        self.assertTrue(output.endswith(
+            "Created 3 of 3 accounts (0 failed)\n"))
+    def test_create_batch_of_users_stops_at_failure(self):
+        MockUserClient.fail = ('b.user@galaxy.org',)
+        status,output = self._create_batch_of_users()
+        self.assertEqual(status,1)
+        self.assertEqual(MockUserClient.created,
+                         ['a.user@galaxy.org',
+                          'b.user@galaxy.org'])
+        self.assertTrue(output.endswith(
+            "Created 1 of 3 accounts (1 failed)\n"))
+    def test_create_batch_of_users_with_failure(self):
+        MockUserClient.fail = ('b.user@galaxy.org',)
+        status,output = self._create_batch_of_users(max_workers=2)
+        self.assertEqual(status,1)
+        self.assertTrue(output.endswith(
+            "Created 2 of 3 accounts (1 failed)\n"))